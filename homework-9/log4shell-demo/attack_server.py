@@ -4,16 +4,32 @@ Simple LDAP Attack Server for Log4Shell Demo
 Shows when vulnerable Log4j makes JNDI connections
 """
 
+import argparse
+import asyncio
+import multiprocessing
+import os
 import socket
+import sys
 import threading
 import time
 from datetime import datetime
 
+import ldap_ber
+from callback_store import EventStore, start_query_server, DEFAULT_QUERY_PORT
+from canary_protocols import (DNSProtocol, HTTPProtocol, RMIProtocol, SESSION_TIMEOUT,
+                              DEFAULT_DNS_PORT, DEFAULT_HTTP_PORT, DEFAULT_RMI_PORT)
+
+DEFAULT_PORT = 1389
+DEFAULT_BACKLOG = 4096
+LOG_FLUSH_INTERVAL = 0.2
+WORKER_READY_TIMEOUT = 10.0
+
 class SimpleLDAPServer:
-    def __init__(self, port=1389):
+    def __init__(self, port=1389, store=None):
         self.port = port
         self.connections = 0
         self.running = True
+        self.store = store
         
     def start(self):
         """Start the LDAP server"""
@@ -31,6 +47,8 @@ class SimpleLDAPServer:
                 try:
                     client, addr = self.sock.accept()
                     self.connections += 1
+                    if self.store is not None:
+                        self.store.record(addr, 'ldap', 'connect')
                     
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] CONNECTION #{self.connections}")
                     print(f"Source: {addr[0]}:{addr[1]}")
@@ -61,12 +79,426 @@ class SimpleLDAPServer:
         except:
             pass
 
+class CallbackProtocol(asyncio.Protocol):
+    """Counts a callback as soon as the connection is accepted, then closes it"""
+    
+    def __init__(self, server):
+        self.server = server
+        
+    def connection_made(self, transport):
+        self.server.record_connection(transport.get_extra_info('peername'))
+        transport.close()
+
+class LDAPProtocol(asyncio.BufferedProtocol):
+    """Counts a callback, then decodes its LDAP requests to learn which DN was looked up
+    
+    The event loop reads straight into a fixed per-connection buffer and
+    ldap_ber parses it in place, so the only copy is the decoded DN. Bind and
+    search get a minimal success response; the session ends on unbind, on a
+    malformed message or after SESSION_TIMEOUT.
+    """
+    
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray(ldap_ber.MAX_MESSAGE_SIZE)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername')
+        self.server.record_connection(self.peer)
+        self.timer = asyncio.get_running_loop().call_later(SESSION_TIMEOUT, transport.close)
+        
+    def connection_lost(self, exc):
+        self.timer.cancel()
+        
+    def get_buffer(self, sizehint):
+        return self.view[self.end:]
+        
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+        try:
+            while True:
+                request, self.start = ldap_ber.decode_message(self.view, self.start, self.end)
+                if request is None:
+                    break
+                if request.dn:
+                    self.server.record_lookup(self.peer, ldap_ber.operation_name(request.tag), request.dn)
+                if request.tag == ldap_ber.TAG_UNBIND_REQUEST:
+                    self.transport.close()
+                    return
+                response = ldap_ber.encode_result(request.message_id, request.tag)
+                if response is None:
+                    self.transport.close()
+                    return
+                self.transport.write(response)
+        except ldap_ber.BERError:
+            self.transport.close()
+            return
+        
+        # Move any partial message to the front so the buffer never grows
+        remaining = self.end - self.start
+        if self.start:
+            self.view[:remaining] = self.view[self.start:self.end]
+            self.start, self.end = 0, remaining
+
+class AsyncLDAPServer(SimpleLDAPServer):
+    """asyncio variant of SimpleLDAPServer for bursts of JNDI callbacks
+    
+    Connections are accepted by the event loop with a large listen backlog and
+    handled without blocking; per-connection output is buffered and written
+    in batches so printing never throttles the accept loop.
+    """
+    
+    def __init__(self, port=DEFAULT_PORT, backlog=DEFAULT_BACKLOG, verbose=True,
+                 reuse_port=False, worker_id=None, shared_counts=None, shared_lookups=None, decode=False,
+                 store=None, ready_pipe=None):
+        super().__init__(port, store)
+        self.backlog = backlog
+        self.verbose = verbose
+        self.decode = decode
+        self.lookups = 0
+        self.protocol_counts = {}
+        self.reuse_port = reuse_port
+        self.worker_id = worker_id
+        self.shared_counts = shared_counts
+        self.shared_lookups = shared_lookups
+        self.ready_pipe = ready_pipe
+        self.loop = None
+        self.server = None
+        self._log_lines = []
+        
+    def record_connection(self, peer, protocol='ldap'):
+        # Only ever called on the event loop thread, so the counters need no lock
+        self.connections += 1
+        self.protocol_counts[protocol] = self.protocol_counts.get(protocol, 0) + 1
+        if self.shared_counts is not None:
+            # Each worker owns one slot, so a plain store is enough
+            self.shared_counts[self.worker_id] = self.connections
+        if self.store is not None:
+            self.store.record(peer, protocol, 'connect')
+        if self.verbose:
+            host, port = peer[0], peer[1]
+            label = f" {protocol.upper()}" if protocol != 'ldap' else ""
+            worker = f" (worker {self.worker_id})" if self.worker_id is not None else ""
+            self._log_lines.append(
+                f"[{datetime.now().strftime('%H:%M:%S')}] CONNECTION #{self.connections}{label}{worker}\n"
+                f"Source: {host}:{port}\n"
+                f"EXPLOIT SUCCESS! Log4j made JNDI connection\n"
+                f"{'-' * 40}\n"
+            )
+            
+    def record_lookup(self, peer, operation, dn, protocol='ldap'):
+        self.lookups += 1
+        if self.shared_lookups is not None:
+            self.shared_lookups[self.worker_id] = self.lookups
+        if self.store is not None:
+            self.store.record(peer, protocol, operation, dn)
+        if self.verbose:
+            self._log_lines.append(
+                f"[{datetime.now().strftime('%H:%M:%S')}] {protocol.upper()} {operation} "
+                f"from {peer[0]}:{peer[1]} DN: {dn!r}\n"
+            )
+            
+    def flush_log(self):
+        if self._log_lines:
+            lines, self._log_lines = self._log_lines, []
+            sys.stdout.write("".join(lines))
+            sys.stdout.flush()
+            
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(LOG_FLUSH_INTERVAL)
+            self.flush_log()
+            
+    async def open_listeners(self):
+        protocol = LDAPProtocol if self.decode else CallbackProtocol
+        self.server = await self.loop.create_server(
+            lambda: protocol(self), '0.0.0.0', self.port,
+            backlog=self.backlog, reuse_address=True, reuse_port=self.reuse_port or None
+        )
+        
+    def close_listeners(self):
+        pass
+        
+    def print_banner(self):
+        if self.worker_id is None:
+            print(f"LDAP Attack Server (asyncio) started on port {self.port} with backlog {self.backlog}")
+            print("Waiting for Log4Shell connections...")
+            print("-" * 40)
+            
+    async def serve(self):
+        """Serve until stop() is called"""
+        self.loop = asyncio.get_running_loop()
+        try:
+            await self.open_listeners()
+        except OSError as e:
+            if self.ready_pipe is None:
+                raise
+            # A worker reports the failed bind to its parent instead of dying with a traceback
+            self.ready_pipe.send(str(e))
+            return
+        if self.ready_pipe is not None:
+            self.ready_pipe.send(None)
+        self.print_banner()
+        
+        flusher = asyncio.create_task(self._flush_periodically())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        except asyncio.CancelledError:
+            # Closed by stop(); a Ctrl+C cancellation still propagates
+            if self.running:
+                raise
+        finally:
+            flusher.cancel()
+            self.close_listeners()
+            self.flush_log()
+            
+    def start(self):
+        """Start the LDAP server"""
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.flush_log()
+        
+    def stop(self):
+        """Stop the server"""
+        self.running = False
+        if self.loop and self.server and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.server.close)
+
+class CanaryServer(AsyncLDAPServer):
+    """AsyncLDAPServer plus RMI, DNS and HTTP canary listeners on the same event loop
+    
+    Every listener reports to the same record_connection/record_lookup, so
+    the counters, log output and event store cover all protocols at once.
+    A port of 0 disables that listener.
+    """
+    
+    def __init__(self, port=DEFAULT_PORT, rmi_port=DEFAULT_RMI_PORT, dns_port=DEFAULT_DNS_PORT,
+                 http_port=DEFAULT_HTTP_PORT, **kwargs):
+        kwargs.setdefault('decode', True)
+        super().__init__(port, **kwargs)
+        self.rmi_port = rmi_port
+        self.dns_port = dns_port
+        self.http_port = http_port
+        self.listeners = []
+        
+    async def open_listeners(self):
+        await super().open_listeners()
+        for protocol, port in ((RMIProtocol, self.rmi_port), (HTTPProtocol, self.http_port)):
+            if port:
+                self.listeners.append(await self.loop.create_server(
+                    lambda protocol=protocol: protocol(self), '0.0.0.0', port,
+                    backlog=self.backlog, reuse_address=True
+                ))
+        if self.dns_port:
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: DNSProtocol(self), local_addr=('0.0.0.0', self.dns_port)
+            )
+            self.listeners.append(transport)
+            
+    def close_listeners(self):
+        for listener in self.listeners:
+            listener.close()
+            
+    def print_banner(self):
+        ports = (("LDAP", self.port), ("RMI", self.rmi_port), ("DNS/udp", self.dns_port), ("HTTP", self.http_port))
+        print(f"Canary listeners started: {', '.join(f'{name} {port}' for name, port in ports if port)}")
+        print("Waiting for Log4Shell connections...")
+        print("-" * 40)
+
+def run_worker(port, backlog, verbose, worker_id, shared_counts, shared_lookups, decode, store_path, ready_pipe):
+    """Entry point of one ReusePortLDAPServer worker process"""
+    # Each worker batches into the shared store file through its own writer
+    store = EventStore(store_path).start() if store_path else None
+    server = AsyncLDAPServer(port, backlog=backlog, verbose=verbose, reuse_port=True, worker_id=worker_id,
+                             shared_counts=shared_counts, shared_lookups=shared_lookups, decode=decode,
+                             store=store, ready_pipe=ready_pipe)
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+
+class ReusePortLDAPServer:
+    """Runs one AsyncLDAPServer per worker process, all bound to the same port
+    
+    Every worker sets SO_REUSEPORT, so the kernel spreads incoming callbacks
+    across them. Each worker publishes its connection count (and, with
+    decode, its lookup count) in its own slot of shared memory arrays, and
+    the parent sums them. start() only goes on to wait for
+    the workers once each of them has reported over a pipe that it is bound.
+    """
+    
+    def __init__(self, port=DEFAULT_PORT, workers=None, backlog=DEFAULT_BACKLOG, verbose=True, decode=False,
+                 store_path=None):
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.backlog = backlog
+        self.verbose = verbose
+        self.decode = decode
+        self.store_path = store_path
+        self.counts = multiprocessing.Array('Q', self.workers, lock=False)
+        self.lookup_counts = multiprocessing.Array('Q', self.workers, lock=False) if decode else None
+        self.processes = []
+        
+    @property
+    def connections(self):
+        return sum(self.counts)
+        
+    @property
+    def lookups(self):
+        return sum(self.lookup_counts) if self.lookup_counts is not None else 0
+        
+    def start(self):
+        """Start the worker processes, check that all of them bound the port, and wait for them"""
+        pipes = []
+        for worker_id in range(self.workers):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=run_worker, name=f"ldap-worker-{worker_id}",
+                args=(self.port, self.backlog, self.verbose, worker_id, self.counts, self.lookup_counts,
+                      self.decode, self.store_path, sender)
+            )
+            process.start()
+            # Only the worker holds the sending end now, so recv() sees EOF if it dies before reporting
+            sender.close()
+            self.processes.append(process)
+            pipes.append(receiver)
+            
+        failures = self.wait_ready(pipes)
+        if failures:
+            for process in self.processes:
+                process.terminate()
+                process.join()
+            raise RuntimeError("LDAP workers failed to start: " + "; ".join(failures))
+            
+        print(f"LDAP Attack Server started on port {self.port} with {self.workers} SO_REUSEPORT workers")
+        print("Waiting for Log4Shell connections...")
+        print("-" * 40)
+        
+        for process in self.processes:
+            process.join()
+            
+    def wait_ready(self, pipes, timeout=WORKER_READY_TIMEOUT):
+        """Wait for every worker's bind report and return the failures"""
+        failures = []
+        deadline = time.monotonic() + timeout
+        for worker_id, pipe in enumerate(pipes):
+            try:
+                if not pipe.poll(max(0.0, deadline - time.monotonic())):
+                    failures.append(f"worker {worker_id}: not bound after {timeout:.0f}s")
+                    continue
+                error = pipe.recv()
+            except EOFError:
+                self.processes[worker_id].join(timeout=1)
+                error = f"exited with code {self.processes[worker_id].exitcode} before binding"
+            finally:
+                pipe.close()
+            if error is not None:
+                failures.append(f"worker {worker_id}: {error}")
+        return failures
+        
+    def stop(self):
+        """Stop the workers; Ctrl+C already reaches them through the process group"""
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+                
+    def report(self):
+        print(f"Total connections received: {self.connections}")
+        for worker_id, count in enumerate(self.counts):
+            lookups = f", {self.lookup_counts[worker_id]} lookups" if self.decode else ""
+            print(f"  worker {worker_id}: {count}{lookups}")
+        if self.decode:
+            print(f"Decoded lookups: {self.lookups}")
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Simple LDAP attack server for the Log4Shell demo")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="use the asyncio server for high callback rates")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="listen backlog for the asyncio server (capped by net.core.somaxconn)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="don't print each connection (asyncio server only)")
+    parser.add_argument("--workers", type=positive_int, default=0,
+                        help="run N asyncio worker processes sharing the port via SO_REUSEPORT")
+    parser.add_argument("--decode", action="store_true",
+                        help="answer LDAP bind/search and print the looked-up DN (asyncio server only)")
+    parser.add_argument("--store", metavar="PATH",
+                        help="record every callback in this SQLite event store")
+    parser.add_argument("--query-port", type=int, default=DEFAULT_QUERY_PORT,
+                        help="local HTTP port for querying the event store (0 to disable)")
+    parser.add_argument("--canary", action="store_true",
+                        help="also listen for RMI, DNS and HTTP callbacks in the same process (implies --decode)")
+    parser.add_argument("--rmi-port", type=int, default=DEFAULT_RMI_PORT)
+    parser.add_argument("--dns-port", type=int, default=DEFAULT_DNS_PORT)
+    parser.add_argument("--http-port", type=int, default=DEFAULT_HTTP_PORT)
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    server = SimpleLDAPServer()
+    args = parse_args()
+    store = None
+    if args.store:
+        # Creates the schema before any worker opens the file
+        store = EventStore(args.store)
+        if args.query_port:
+            start_query_server(args.store, args.query_port)
+            print(f"Event store {args.store}, queries on http://127.0.0.1:{args.query_port}/events and /stats")
+    if args.canary and args.workers:
+        sys.exit("--canary runs every listener in one process and can't be combined with --workers")
+    if args.workers:
+        server = ReusePortLDAPServer(args.port, workers=args.workers, backlog=args.backlog,
+                                     verbose=not args.quiet, decode=args.decode, store_path=args.store)
+    else:
+        if store is not None:
+            store.start()
+        if args.canary:
+            server = CanaryServer(args.port, rmi_port=args.rmi_port, dns_port=args.dns_port,
+                                  http_port=args.http_port, backlog=args.backlog,
+                                  verbose=not args.quiet, store=store)
+        elif args.use_async or args.decode:
+            server = AsyncLDAPServer(args.port, backlog=args.backlog, verbose=not args.quiet,
+                                     decode=args.decode, store=store)
+        else:
+            server = SimpleLDAPServer(args.port, store=store)
     try:
         server.start()
+    except RuntimeError as e:
+        if store is not None:
+            store.close()
+        sys.exit(str(e))
     except KeyboardInterrupt:
         print("\nStopping server...")
         server.stop()
-        print(f"Total connections received: {server.connections}")
+        if args.workers:
+            server.report()
+        else:
+            print(f"Total connections received: {server.connections}")
+            if args.canary:
+                for protocol, count in sorted(server.protocol_counts.items()):
+                    print(f"  {protocol}: {count}")
+            if args.decode or args.canary:
+                print(f"Decoded lookups: {server.lookups}")
+        if store is not None:
+            store.close()
         print("Server stopped.")
\ No newline at end of file
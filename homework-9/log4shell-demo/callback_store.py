@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Callback Event Store for the attack server
+Records every callback as a structured event in an append-only SQLite
+table, written in batches by a background thread, and serves filtered
+queries and aggregates over a small local HTTP endpoint
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+DEFAULT_QUERY_PORT = 8389
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source_ip TEXT NOT NULL,
+    source_port INTEGER NOT NULL,
+    protocol TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    dn TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_source_ts ON events (source_ip, ts);
+CREATE INDEX IF NOT EXISTS events_dn ON events (dn);
+"""
+COLUMNS = ('id', 'ts', 'source_ip', 'source_port', 'protocol', 'operation', 'dn')
+
+# Filters accepted by the query endpoint, mapped to their SQL condition
+FILTERS = {
+    'source': 'source_ip = ?',
+    'protocol': 'protocol = ?',
+    'operation': 'operation = ?',
+    'dn': 'dn = ?',
+    'since': 'ts >= ?',
+    'until': 'ts < ?',
+}
+GROUPS = {
+    'source': 'source_ip',
+    'protocol': 'protocol',
+    'operation': 'operation',
+    'dn': 'dn',
+    'minute': 'CAST(ts / 60 AS INTEGER) * 60',
+}
+
+
+class QueryError(ValueError):
+    """Raised for query parameters the store can't answer"""
+
+
+def connect(path, read_only=False):
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(path)
+    # WAL lets the query endpoint and several worker processes share the file
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+class EventStore:
+    """Append-only callback store fed from an in-memory queue
+
+    record() only enqueues a tuple, so it is cheap enough to call from the
+    accept path; a writer thread inserts whatever has queued up in one
+    transaction per batch.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        conn = connect(path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def start(self):
+        self._writer = threading.Thread(target=self._write_loop, name='event-writer', daemon=True)
+        self._writer.start()
+        return self
+
+    def record(self, peer, protocol, operation, dn=None, ts=None):
+        self._queue.put((ts or time.time(), peer[0], peer[1], protocol, operation, dn))
+
+    def close(self):
+        """Flush everything still queued and stop the writer"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                rows = [row for row in batch if row is not None]
+                if rows:
+                    try:
+                        with conn:
+                            conn.executemany(
+                                "INSERT INTO events (ts, source_ip, source_port, protocol, operation, dn) "
+                                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                        self.written += len(rows)
+                    except sqlite3.Error as e:
+                        # Drop this batch but keep the writer alive for the ones after it
+                        self.failed += len(rows)
+                        print(f"Event store write failed ({len(rows)} events dropped): {e}")
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+
+def build_where(params):
+    conditions, values = [], []
+    for name, value in params.items():
+        if name not in FILTERS:
+            continue
+        if name in ('since', 'until'):
+            try:
+                value = float(value)
+            except ValueError:
+                raise QueryError(f"{name} must be a unix timestamp")
+        conditions.append(FILTERS[name])
+        values.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, values
+
+
+def query_events(conn, params):
+    """Most recent events matching the filters, newest first"""
+    try:
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError("limit must be an integer")
+    # SQLite treats a negative LIMIT as no limit at all
+    if limit < 1:
+        raise QueryError("limit must be at least 1")
+    limit = min(limit, MAX_LIMIT)
+    where, values = build_where(params)
+    rows = conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM events{where} ORDER BY ts DESC LIMIT ?", values + [limit])
+    events = []
+    for row in rows:
+        event = dict(zip(COLUMNS, row))
+        event['time'] = datetime.fromtimestamp(event['ts'], timezone.utc).isoformat()
+        events.append(event)
+    return events
+
+
+def query_stats(conn, params):
+    """Event counts grouped by one column, with first and last seen times"""
+    group = params.get('by', 'source')
+    if group not in GROUPS:
+        raise QueryError(f"by must be one of {', '.join(GROUPS)}")
+    where, values = build_where(params)
+    total = conn.execute(f"SELECT COUNT(*) FROM events{where}", values).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT {GROUPS[group]} AS key, COUNT(*), MIN(ts), MAX(ts) FROM events{where} "
+        f"GROUP BY key ORDER BY COUNT(*) DESC", values)
+    return {
+        'total': total,
+        'by': group,
+        'groups': [{'key': key, 'count': count, 'first_seen': first, 'last_seen': last}
+                   for key, count, first, last in rows],
+    }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /events and GET /stats over the store, with filters as query parameters"""
+
+    routes = {'/events': query_events, '/stats': query_stats}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            return self.send_json(404, {'error': 'Not found', 'endpoints': list(self.routes)})
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        conn = connect(self.server.store_path, read_only=True)
+        try:
+            self.send_json(200, handler(conn, params))
+        except QueryError as e:
+            self.send_json(400, {'error': str(e)})
+        finally:
+            conn.close()
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_query_server(store_path, port=DEFAULT_QUERY_PORT, host='127.0.0.1'):
+    """Serve the query endpoint from a daemon thread; only listens on loopback by default"""
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.store_path = store_path
+    threading.Thread(target=server.serve_forever, name='event-query', daemon=True).start()
+    return server
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Canary Protocol Handlers for the attack server
+RMI, DNS and HTTP listeners that run on the same event loop as the LDAP
+listener. Each does the smallest handshake that gets the client to reveal
+what it looked up, reports it to the server, and hangs up
+"""
+
+import asyncio
+import struct
+from abc import ABC, abstractmethod
+
+SESSION_TIMEOUT = 5.0
+MAX_REQUEST_SIZE = 4096
+
+DEFAULT_RMI_PORT = 1099
+DEFAULT_DNS_PORT = 1053
+DEFAULT_HTTP_PORT = 8180
+
+# JRMP constants (Java RMI wire protocol)
+RMI_MAGIC = b'JRMI'
+RMI_STREAM_PROTOCOL = 0x4b
+RMI_SINGLE_OP_PROTOCOL = 0x4c
+RMI_PROTOCOL_ACK = 0x4e
+RMI_CALL = 0x50
+STREAM_MAGIC = b'\xac\xed\x00\x05'
+TC_STRING = 0x74
+TC_BLOCKDATA = 0x77
+TC_BLOCKDATALONG = 0x7a
+
+DNS_HEADER = struct.Struct('!HHHHHH')
+DNS_NXDOMAIN = 3
+
+HTTP_NOT_FOUND = b"HTTP/1.0 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+class SessionProtocol(asyncio.Protocol, ABC):
+    """Counts the connection, buffers what the client sends and enforces a deadline"""
+
+    protocol = None
+
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername')
+        self.server.record_connection(self.peer, self.protocol)
+        self.timer = asyncio.get_running_loop().call_later(SESSION_TIMEOUT, transport.close)
+
+    def connection_lost(self, exc):
+        self.timer.cancel()
+
+    def data_received(self, data):
+        self.buffer += data
+        try:
+            done = self.handle()
+        except ValueError:
+            done = True
+        if done or len(self.buffer) > MAX_REQUEST_SIZE:
+            self.transport.close()
+
+    @abstractmethod
+    def handle(self):
+        """Process self.buffer; return True once the session is finished"""
+
+
+def read_rmi_call(data):
+    """Return the name passed to a registry call (e.g. lookup), or None if more data is needed
+
+    The call body is a Java serialization stream: block data holding the
+    object id, operation and interface hash, then the name as TC_STRING.
+    """
+    if len(data) < 5:
+        return None
+    if data[0] != RMI_CALL or data[1:5] != STREAM_MAGIC:
+        raise ValueError("Not an RMI call")
+    offset = 5
+    while offset < len(data):
+        tag = data[offset]
+        if tag == TC_BLOCKDATA:
+            if offset + 2 > len(data):
+                return None
+            offset += 2 + data[offset + 1]
+        elif tag == TC_BLOCKDATALONG:
+            if offset + 5 > len(data):
+                return None
+            offset += 5 + int.from_bytes(data[offset + 1:offset + 5], 'big')
+        elif tag == TC_STRING:
+            if offset + 3 > len(data):
+                return None
+            length = int.from_bytes(data[offset + 1:offset + 3], 'big')
+            if offset + 3 + length > len(data):
+                return None
+            return data[offset + 3:offset + 3 + length].decode('utf-8', 'replace')
+        else:
+            raise ValueError(f"Unexpected serialization tag 0x{tag:02x}")
+    return None
+
+
+class RMIProtocol(SessionProtocol):
+    """Acknowledges the JRMP handshake and reads the name from the first registry call"""
+
+    protocol = 'rmi'
+
+    def __init__(self, server):
+        super().__init__(server)
+        self.state = 'header'
+
+    def handle(self):
+        if self.state == 'header':
+            if len(self.buffer) < 7:
+                return False
+            if self.buffer[:4] != RMI_MAGIC:
+                raise ValueError("Not JRMP")
+            protocol = self.buffer[6]
+            del self.buffer[:7]
+            if protocol == RMI_STREAM_PROTOCOL:
+                # ProtocolAck carries the client's address as the server sees it
+                host = self.peer[0].encode()
+                self.transport.write(bytes((RMI_PROTOCOL_ACK,)) + struct.pack('!H', len(host)) + host
+                                     + struct.pack('!I', self.peer[1]))
+                self.state = 'endpoint'
+            elif protocol == RMI_SINGLE_OP_PROTOCOL:
+                self.state = 'call'
+            else:
+                raise ValueError("Unsupported JRMP protocol")
+
+        if self.state == 'endpoint':
+            # The client answers with its own endpoint: UTF host and an int port
+            if len(self.buffer) < 2:
+                return False
+            size = 2 + struct.unpack_from('!H', self.buffer)[0] + 4
+            if len(self.buffer) < size:
+                return False
+            del self.buffer[:size]
+            self.state = 'call'
+
+        name = read_rmi_call(self.buffer)
+        if name is None:
+            return False
+        self.server.record_lookup(self.peer, 'call', name, self.protocol)
+        return True
+
+
+class HTTPProtocol(SessionProtocol):
+    """Records the request line of a codebase or probe request and answers 404"""
+
+    protocol = 'http'
+
+    def handle(self):
+        end = self.buffer.find(b'\r\n')
+        if end < 0:
+            return False
+        parts = bytes(self.buffer[:end]).decode('latin-1').split(' ')
+        if len(parts) != 3:
+            raise ValueError("Bad request line")
+        method, path, _ = parts
+        self.server.record_lookup(self.peer, method, path, self.protocol)
+        self.transport.write(HTTP_NOT_FOUND)
+        return True
+
+
+def read_dns_question(data):
+    """Return (qname, end_of_question) for the first question of a DNS query"""
+    if len(data) < DNS_HEADER.size:
+        raise ValueError("Short DNS packet")
+    _, flags, questions, _, _, _ = DNS_HEADER.unpack_from(data)
+    if flags & 0x8000 or questions < 1:
+        raise ValueError("Not a DNS query")
+    labels = []
+    offset = DNS_HEADER.size
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated name")
+        length = data[offset]
+        offset += 1
+        if length == 0:
+            break
+        if length & 0xc0:
+            raise ValueError("Compressed names are not expected in a question")
+        labels.append(data[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    # QTYPE and QCLASS follow the name
+    if offset + 4 > len(data):
+        raise ValueError("Truncated question")
+    return '.'.join(labels), offset + 4
+
+
+class DNSProtocol(asyncio.DatagramProtocol):
+    """Records the queried name and answers NXDOMAIN, echoing the question"""
+
+    protocol = 'dns'
+
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            name, end = read_dns_question(data)
+        except ValueError:
+            return
+        self.server.record_connection(addr, self.protocol)
+        self.server.record_lookup(addr, 'query', name, self.protocol)
+        query_id, flags = struct.unpack_from('!HH', data)
+        # QR set, opcode and RD copied from the query, RCODE NXDOMAIN
+        flags = 0x8000 | (flags & 0x7900) | DNS_NXDOMAIN
+        self.transport.sendto(DNS_HEADER.pack(query_id, flags, 1, 0, 0, 0) + data[DNS_HEADER.size:end], addr)
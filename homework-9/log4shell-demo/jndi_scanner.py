@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Streaming JNDI Payload Scanner for Log Files
+Sweeps existing logs for past Log4Shell attempts, including obfuscated
+forms such as ${${lower:j}ndi:...} and ${${::-j}ndi:...} that a single
+\\$\\{jndi: regex misses. Files are memory-mapped and split into chunks
+scanned in parallel; every hit is reported with its byte offset
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+CHUNK_SIZE = 64 * 1024 * 1024
+MAX_LINE_LENGTH = 64 * 1024
+MAX_EXPANSIONS = 256
+SNIPPET_LENGTH = 200
+
+# Matched against the normalized, lower-cased line
+PAYLOAD_PATTERNS = [
+    '${jndi:',
+    'jndi:ldap:', 'jndi:ldaps:', 'jndi:rmi:', 'jndi:dns:', 'jndi:iiop:',
+    'jndi:corba:', 'jndi:nds:', 'jndi:nis:', 'jndi:http:',
+]
+# Matched against the raw, lower-cased line: lookups only used to hide a payload
+OBFUSCATION_PATTERNS = [
+    '${lower:', '${upper:', '${::-', '${env:', '${sys:', '${date:', '${base64:',
+    # Every variable lookup expand_lookup resolves can hide a payload the same way
+    '${ctx:', '${main:', '${map:', '${sd:', '${marker:', '${bundle:', '${k8s:', '${docker:',
+]
+
+# An innermost lookup: ${...} with no nested ${ or } inside
+INNERMOST_LOOKUP = re.compile(r'\$\{([^${}]*)\}')
+# Stand-in for the ${ of lookups that stay as they are, so they aren't matched again
+KEPT_OPEN = '\x00{'
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over the text reports every pattern occurrence"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(index)
+
+        # Breadth-first pass to fill in failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text):
+        """Yield (end_offset, pattern) for every match in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position + 1, self.patterns[index]
+
+
+PAYLOAD_MATCHER = AhoCorasick(PAYLOAD_PATTERNS)
+OBFUSCATION_MATCHER = AhoCorasick(OBFUSCATION_PATTERNS)
+
+
+def expand_lookup(match):
+    """Replacement for one innermost lookup, evaluated the way Log4j would"""
+    body = match.group(1)
+    prefix, sep, rest = body.partition(':')
+    key = prefix.strip().lower()
+    if sep and key == 'lower':
+        return rest.lower()
+    if sep and key == 'upper':
+        return rest.upper()
+    if ':-' in body:
+        # ${::-j}, ${env:NOPE:-j}, ${sys:x:-j}: an unresolved variable falls back to its default
+        return body.split(':-', 1)[1]
+    if sep and key == 'date' and len(rest) >= 2 and rest[0] == rest[-1] == "'":
+        return rest[1:-1]
+    if sep and key in ('env', 'sys', 'ctx', 'main', 'map', 'sd', 'marker', 'bundle', 'k8s', 'docker'):
+        # A plain variable lookup with no default; assume it resolves to nothing
+        return ''
+    return KEPT_OPEN + body + '}'
+
+
+def normalize(text):
+    """Resolve nested string lookups innermost first, e.g. ${${lower:J}ndi:...} -> ${jndi:...}"""
+    for _ in range(MAX_EXPANSIONS):
+        expanded = INNERMOST_LOOKUP.sub(expand_lookup, text)
+        if expanded == text:
+            break
+        text = expanded
+    return text.replace(KEPT_OPEN, '${').lower()
+
+
+def scan_line(line):
+    """Return (payload_patterns, obfuscation_patterns, normalized) for a line, or None if it is clean"""
+    text = line[:MAX_LINE_LENGTH].decode('latin-1')
+    normalized = normalize(text)
+    payloads = sorted({pattern for _, pattern in PAYLOAD_MATCHER.search(normalized)})
+    if not payloads:
+        return None
+    obfuscation = sorted({pattern for _, pattern in OBFUSCATION_MATCHER.search(text.lower())})
+    return payloads, obfuscation, normalized
+
+
+def line_aligned(mm, offset):
+    """First line start at or after offset"""
+    if offset == 0 or mm[offset - 1:offset] == b'\n':
+        return offset
+    newline = mm.find(b'\n', offset)
+    return len(mm) if newline < 0 else newline + 1
+
+
+def scan_chunk(task):
+    """Scan lines starting in [start, end) of one file; runs in a worker process"""
+    path, start, end = task
+    hits = []
+    truncated = []
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = line_aligned(mm, start)
+            # The last line that starts in the chunk may run past its end
+            stop = line_aligned(mm, end)
+            while pos < stop:
+                # Lines without ${ can't hold a lookup; skip them at memchr speed
+                candidate = mm.find(b'${', pos, stop)
+                if candidate < 0:
+                    break
+                line_start = mm.rfind(b'\n', pos, candidate) + 1 or pos
+                line_end = mm.find(b'\n', candidate, stop)
+                if line_end < 0:
+                    line_end = stop
+                line = mm[line_start:line_end]
+                if len(line) > MAX_LINE_LENGTH:
+                    # Only the head of the line is scanned; the caller reports it
+                    truncated.append(line_start)
+                result = scan_line(line)
+                if result is not None:
+                    payloads, obfuscation, normalized = result
+                    hits.append({
+                        'file': path,
+                        'offset': candidate,
+                        'line_offset': line_start,
+                        'patterns': payloads,
+                        'obfuscation': obfuscation,
+                        'snippet': line[candidate - line_start:][:SNIPPET_LENGTH].decode('latin-1'),
+                        'normalized': normalized[normalized.find('${'):][:SNIPPET_LENGTH],
+                        'truncated': len(line) > MAX_LINE_LENGTH,
+                    })
+                pos = line_end + 1
+    return path, end - start, hits, truncated
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def build_tasks(paths, chunk_size):
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    tasks = []
+    for path in iter_files(paths):
+        size = os.path.getsize(path)
+        # mmap can't map empty files, and they can't hold hits anyway
+        for start in range(0, size, chunk_size):
+            tasks.append((path, start, min(start + chunk_size, size)))
+    return tasks
+
+
+def scan(paths, workers=None, chunk_size=CHUNK_SIZE):
+    """Yield hits as chunks complete
+
+    Returns (bytes_scanned, files, chunks, truncated) when exhausted, where
+    truncated lists the (file, line_offset) of lines with a lookup that were
+    longer than MAX_LINE_LENGTH and only scanned up to it.
+    """
+    tasks = build_tasks(paths, chunk_size)
+    scanned = 0
+    truncated = []
+    if workers == 1 or len(tasks) <= 1:
+        results = map(scan_chunk, tasks)
+        for path, size, hits, long_lines in results:
+            scanned += size
+            truncated.extend((path, offset) for offset in long_lines)
+            yield from hits
+    else:
+        with Pool(workers) as pool:
+            for path, size, hits, long_lines in pool.imap_unordered(scan_chunk, tasks):
+                scanned += size
+                truncated.extend((path, offset) for offset in long_lines)
+                yield from hits
+    return scanned, len({task[0] for task in tasks}), len(tasks), sorted(truncated)
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Scan log files for obfuscated JNDI (Log4Shell) payloads")
+    parser.add_argument("paths", nargs="+", help="log files or directories to scan")
+    parser.add_argument("--workers", type=positive_int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=positive_int, default=CHUNK_SIZE // (1024 * 1024), help="chunk size in MiB")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per hit")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    start = time.perf_counter()
+    hits = 0
+    results = scan(args.paths, args.workers, args.chunk_size * 1024 * 1024)
+    while True:
+        try:
+            hit = next(results)
+        except StopIteration as done:
+            scanned, files, chunks, truncated = done.value
+            break
+        hits += 1
+        if args.json:
+            print(json.dumps(hit))
+        else:
+            tags = ",".join(hit['patterns'] + (["obfuscated"] if hit['obfuscation'] else []))
+            print(f"{hit['file']}:{hit['offset']}: [{tags}] {hit['snippet']}")
+    elapsed = time.perf_counter() - start
+
+    for path, offset in truncated:
+        print(f"{path}:{offset}: warning: line longer than {MAX_LINE_LENGTH} bytes, only its start was scanned",
+              file=sys.stderr)
+    rate = scanned / elapsed / (1024 * 1024) if elapsed else 0.0
+    print(f"Scanned {scanned / (1024 * 1024):.1f} MiB in {files} files ({chunks} chunks) "
+          f"in {elapsed:.2f}s ({rate:.0f} MiB/s): {hits} hits"
+          + (f", {len(truncated)} lines truncated" if truncated else ""), file=sys.stderr)
+    sys.exit(1 if hits else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Minimal LDAPv3 BER decoder/encoder for the attack server
+Decodes just enough of BindRequest and SearchRequest to recover the DN a
+JNDI lookup asks for, reading lengths and tags straight out of a memoryview
+so no bytes are copied until the DN itself is decoded
+"""
+
+from collections import namedtuple
+
+# Universal and LDAP application tags (RFC 4511)
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_ENUMERATED = 0x0a
+TAG_SEQUENCE = 0x30
+TAG_BIND_REQUEST = 0x60
+TAG_BIND_RESPONSE = 0x61
+TAG_UNBIND_REQUEST = 0x42
+TAG_SEARCH_REQUEST = 0x63
+TAG_SEARCH_RESULT_DONE = 0x65
+
+OPERATIONS = {
+    TAG_BIND_REQUEST: 'bind',
+    TAG_UNBIND_REQUEST: 'unbind',
+    TAG_SEARCH_REQUEST: 'search',
+}
+RESPONSE_TAGS = {
+    TAG_BIND_REQUEST: TAG_BIND_RESPONSE,
+    TAG_SEARCH_REQUEST: TAG_SEARCH_RESULT_DONE,
+}
+
+RESULT_SUCCESS = 0
+MAX_MESSAGE_SIZE = 4096
+
+LDAPRequest = namedtuple('LDAPRequest', 'message_id tag dn')
+
+
+class BERError(ValueError):
+    """Raised for input that is not a well-formed LDAP message"""
+
+
+def read_header(view, offset, end):
+    """Read the tag and length at offset
+
+    Returns (tag, length, content_offset), or None if the header isn't complete yet.
+    """
+    if end - offset < 2:
+        return None
+    tag = view[offset]
+    if tag & 0x1f == 0x1f:
+        raise BERError("High tag numbers are not used by LDAP")
+    length = view[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7f
+        if count == 0:
+            raise BERError("Indefinite lengths are not allowed in LDAP")
+        if count > 4:
+            raise BERError("Length field too long")
+        if end - offset < count:
+            return None
+        length = 0
+        for i in range(offset, offset + count):
+            length = (length << 8) | view[i]
+        offset += count
+    return tag, length, offset
+
+
+def read_element(view, offset, end, expected_tag):
+    """Read a complete element nested inside an already buffered message"""
+    header = read_header(view, offset, end)
+    if header is None:
+        raise BERError("Truncated element")
+    tag, length, content = header
+    if tag != expected_tag:
+        raise BERError(f"Expected tag 0x{expected_tag:02x}, got 0x{tag:02x}")
+    if content + length > end:
+        raise BERError("Element overruns its parent")
+    return content, content + length
+
+
+def read_integer(view, start, stop):
+    if stop - start < 1 or stop - start > 4:
+        raise BERError("Bad INTEGER length")
+    value = view[start] - 256 if view[start] & 0x80 else view[start]
+    for i in range(start + 1, stop):
+        value = (value << 8) | view[i]
+    return value
+
+
+def decode_message(view, offset, end):
+    """Decode one LDAPMessage from view[offset:end]
+
+    Returns (request, next_offset); request is None when the message is not
+    complete yet, in which case next_offset == offset and the caller should
+    wait for more data.
+    """
+    header = read_header(view, offset, end)
+    if header is None:
+        return None, offset
+    tag, length, content = header
+    if tag != TAG_SEQUENCE:
+        raise BERError(f"Expected LDAPMessage SEQUENCE, got 0x{tag:02x}")
+    if content - offset + length > MAX_MESSAGE_SIZE:
+        raise BERError("Message too large")
+    message_end = content + length
+    if message_end > end:
+        return None, offset
+
+    start, stop = read_element(view, content, message_end, TAG_INTEGER)
+    message_id = read_integer(view, start, stop)
+
+    op_header = read_header(view, stop, message_end)
+    if op_header is None:
+        raise BERError("Missing protocolOp")
+    op_tag, op_length, op_content = op_header
+    op_end = op_content + op_length
+    if op_end > message_end:
+        raise BERError("protocolOp overruns the message")
+
+    dn = None
+    if op_tag == TAG_BIND_REQUEST:
+        # BindRequest ::= [APPLICATION 0] SEQUENCE { version INTEGER, name LDAPDN, ... }
+        _, version_end = read_element(view, op_content, op_end, TAG_INTEGER)
+        start, stop = read_element(view, version_end, op_end, TAG_OCTET_STRING)
+        dn = str(view[start:stop], 'utf-8', 'replace')
+    elif op_tag == TAG_SEARCH_REQUEST:
+        # SearchRequest ::= [APPLICATION 3] SEQUENCE { baseObject LDAPDN, ... }
+        start, stop = read_element(view, op_content, op_end, TAG_OCTET_STRING)
+        dn = str(view[start:stop], 'utf-8', 'replace')
+
+    return LDAPRequest(message_id, op_tag, dn), message_end
+
+
+def operation_name(tag):
+    return OPERATIONS.get(tag, f'0x{tag:02x}')
+
+
+def encode_integer(value):
+    length = max(1, (value.bit_length() + 8) // 8)
+    return value.to_bytes(length, 'big', signed=True)
+
+
+def encode_result(message_id, request_tag, result_code=RESULT_SUCCESS):
+    """Encode the LDAPResult answering a request, with empty matchedDN and diagnosticMessage
+
+    Returns None for operations that get no response (unbind) or that we don't answer.
+    """
+    response_tag = RESPONSE_TAGS.get(request_tag)
+    if response_tag is None:
+        return None
+    message_id = encode_integer(message_id)
+    result = bytes((TAG_ENUMERATED, 1, result_code, TAG_OCTET_STRING, 0, TAG_OCTET_STRING, 0))
+    body = bytes((TAG_INTEGER, len(message_id))) + message_id + bytes((response_tag, len(result))) + result
+    return bytes((TAG_SEQUENCE, len(body))) + body
+
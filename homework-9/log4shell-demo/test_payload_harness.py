@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the Payload Correlation Harness
+Runs PayloadHarness end to end against a fake target that resolves each
+payload the way Log4j would and makes the LDAP callback itself
+"""
+
+import re
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from jndi_scanner import normalize
+from payload_harness import PayloadHarness, VARIANTS
+
+LDAP_URL = re.compile(r'jndi:ldap://[^/:]+:(\d+)/([0-9a-z]+)', re.IGNORECASE)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def bind_request(dn):
+    """A minimal LDAPv3 BindRequest with message id 1 and an empty simple password"""
+    name = dn.encode()
+    bind = bytes([0x02, 1, 3, 0x04, len(name)]) + name + bytes([0x80, 0])
+    message = bytes([0x02, 1, 1, 0x60, len(bind)]) + bind
+    return bytes([0x30, len(message)]) + message
+
+
+class VulnerableTarget(BaseHTTPRequestHandler):
+    """Answers POST /log and follows any ldap:// lookup in the body"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        match = LDAP_URL.search(normalize(body))
+        if match is not None:
+            port, token = match.groups()
+            with socket.create_connection(('127.0.0.1', int(port)), timeout=5) as conn:
+                conn.sendall(bind_request(token))
+                conn.recv(64)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_harness_correlates_ldap_callbacks():
+    target = ThreadingHTTPServer(('127.0.0.1', 0), VulnerableTarget)
+    threading.Thread(target=target.serve_forever, daemon=True).start()
+    try:
+        ports = {'ldap': free_port(), 'rmi': 0, 'dns': 0, 'http': 0}
+        harness = PayloadHarness([('fake', f"http://127.0.0.1:{target.server_port}")], '127.0.0.1', ports,
+                                 concurrency=4, wait=1.0)
+        summary = harness.run()
+    finally:
+        target.shutdown()
+        target.server_close()
+
+    assert summary['requests'] == len(VARIANTS)
+    assert summary['unmatched_callbacks'] == 0
+    rows = {row['variant']: row for row in summary['variants']}
+    for variant, scheme, _ in VARIANTS:
+        assert rows[variant]['statuses'] == {'200': 1}
+        assert rows[variant]['triggered'] == (scheme == 'ldap'), variant
+    assert summary['callbacks'] == sum(1 for _, scheme, _ in VARIANTS if scheme == 'ldap')
@@ -0,0 +1,159 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# Admission limits, overridable from the environment
+QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '1.0'))
+RATE_LIMIT_PER_SEC = float(os.environ.get('RATE_LIMIT_PER_SEC', '5'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '10'))
+MAX_TRACKED_CLIENTS = 10000
+
+
+class TokenBucket:
+    """Per-client token buckets; clients are kept in an LRU so the table stays bounded."""
+
+    def __init__(self, rate=RATE_LIMIT_PER_SEC, burst=RATE_LIMIT_BURST, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.limited = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Spend one token for client; returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            else:
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent work and queues a bounded number of waiters in FIFO order.
+
+    A request that finds the queue full, or waits longer than queue_timeout,
+    is shed instead of piling up, so admitted requests keep a predictable
+    latency under overload.
+    """
+
+    def __init__(self, max_concurrent, max_queue, queue_timeout=QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot; returns False when the request should be shed."""
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.shed_queue_full += 1
+                return False
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            self.queued += 1
+
+        if waiter.wait(self.queue_timeout):
+            return True
+        with self._lock:
+            # The slot may have been handed over between the timeout and taking the lock
+            if waiter.is_set():
+                return True
+            self._waiters.remove(waiter)
+            self.shed_timeout += 1
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter; active stays the same
+                self.admitted += 1
+                self._waiters.popleft().set()
+            else:
+                self.active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'queue_depth': len(self._waiters),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+            }
+
+
+class AdmissionController:
+    """Rate limit per client, then bound concurrency, for one group of endpoints."""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout=QUEUE_TIMEOUT,
+                 rate=RATE_LIMIT_PER_SEC, burst=RATE_LIMIT_BURST):
+        self.name = name
+        self.limiter = ConcurrencyLimiter(max_concurrent, max_queue, queue_timeout)
+        self.buckets = TokenBucket(rate, burst) if rate > 0 else None
+
+    def __call__(self, view):
+        @wraps(view)
+        def admitted(*args, **kwargs):
+            if self.buckets is not None:
+                wait = self.buckets.take(request.remote_addr)
+                if wait:
+                    response = jsonify({"error": "Rate limit exceeded"})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(math.ceil(wait))
+                    return response
+
+            if not self.limiter.acquire():
+                response = jsonify({"error": "Server busy, try again later"})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(max(1, math.ceil(self.limiter.queue_timeout)))
+                return response
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                self.limiter.release()
+                raise
+            if response.is_streamed:
+                # Keep the slot until the streamed body has been sent
+                response.call_on_close(self.limiter.release)
+            else:
+                self.limiter.release()
+            return response
+        return admitted
+
+    def stats(self):
+        stats = self.limiter.stats()
+        stats['rate_limited'] = self.buckets.limited if self.buckets is not None else 0
+        stats['tracked_clients'] = len(self.buckets) if self.buckets is not None else 0
+        return stats
+
@@ -1,10 +1,32 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import json
+import math
 import os
-import subprocess
-import ast
 import ipaddress
 
+from probe import probe_engine, PROBE_METHODS, DEFAULT_TCP_PORT, DEFAULT_TIMEOUT, MAX_TIMEOUT
+from admission import AdmissionController
+from calculator import calculate as evaluate_expression, calculate_batch, compile_expression, CalculationError
+
+# Largest number of addresses a single /ping/batch request may cover
+MAX_BATCH_TARGETS = int(os.environ.get('PING_BATCH_MAX_TARGETS', '65536'))
+# Largest number of rows a single /calculate/batch request may evaluate
+MAX_BATCH_ROWS = int(os.environ.get('CALC_BATCH_MAX_ROWS', '100000'))
+
+# Admission control for the expensive endpoints: per-client rate limits plus bounded concurrency
+ping_admission = AdmissionController(
+    'ping',
+    max_concurrent=int(os.environ.get('PING_MAX_CONCURRENT', '32')),
+    max_queue=int(os.environ.get('PING_MAX_QUEUE', '64')),
+)
+calculate_admission = AdmissionController(
+    'calculate',
+    max_concurrent=int(os.environ.get('CALC_MAX_CONCURRENT', str(os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('CALC_MAX_QUEUE', '16')),
+)
+
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))
 
 # Retrieve password from environment variable instead of hardcoding
 PASSWORD = os.environ.get('PASSWORD', 'default_password')
@@ -16,26 +38,149 @@ def hello():
         return jsonify({"error": "Invalid name"}), 400
     return f"Hello, {name}!"
 
-# Secure ping route with input validation and no shell=True
+def probe_options(args):
+    """Validate the shared method/port/timeout probe parameters."""
+    method = args.get('method', 'auto')
+    if method not in PROBE_METHODS:
+        return None, "Invalid method"
+    try:
+        port = int(args.get('port', DEFAULT_TCP_PORT))
+        timeout = float(args.get('timeout', DEFAULT_TIMEOUT))
+    except (TypeError, ValueError):
+        return None, "Invalid port or timeout"
+    if not 0 < port < 65536 or not 0 < timeout <= MAX_TIMEOUT:
+        return None, "Invalid port or timeout"
+    return {'method': method, 'port': port, 'timeout': timeout}, None
+
+# Ping route probing in-process (ICMP datagram or TCP connect) instead of forking ping
 @app.route('/ping')
+@ping_admission
 def ping():
     ip = request.args.get('ip')
     try:
         ipaddress.ip_address(ip)  # Validate IP address
-        result = subprocess.check_output(["ping", "-c", "1", ip])
-        return result
     except ValueError:
         return jsonify({"error": "Invalid IP address"}), 400
+    options, error = probe_options(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    result = probe_engine.probe(ip, **options)
+    if 'error' in result:
+        # The requested probe method can't run on this host
+        return jsonify(result), 503
+    return jsonify(result)
+
+# Batch ping: a CIDR or list of IPs, results streamed as NDJSON or SSE in completion order
+@app.route('/ping/batch', methods=['GET', 'POST'])
+@ping_admission
+def ping_batch():
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    if not isinstance(params, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    cidr = params.get('cidr')
+    ips = params.get('ips')
+    if isinstance(ips, str):
+        ips = [ip for ip in ips.split(',') if ip]
+
+    if cidr and not ips:
+        if not isinstance(cidr, str):
+            return jsonify({"error": "Invalid CIDR"}), 400
+        try:
+            network = ipaddress.ip_network(cidr, strict=False)  # Validate CIDR
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid CIDR"}), 400
+        if network.num_addresses > MAX_BATCH_TARGETS:
+            return jsonify({"error": f"CIDR covers more than {MAX_BATCH_TARGETS} addresses"}), 400
+        targets = network.hosts()
+    elif ips and not cidr and isinstance(ips, list):
+        if len(ips) > MAX_BATCH_TARGETS:
+            return jsonify({"error": f"More than {MAX_BATCH_TARGETS} addresses"}), 400
+        # ip_address() would also take integers, so only strings are addresses
+        if not all(isinstance(ip, str) for ip in ips):
+            return jsonify({"error": "Invalid IP address"}), 400
+        try:
+            targets = [ipaddress.ip_address(ip) for ip in ips]  # Validate every IP address
+        except ValueError:
+            return jsonify({"error": "Invalid IP address"}), 400
+    else:
+        return jsonify({"error": "Provide either cidr or ips"}), 400
+
+    options, error = probe_options(params)
+    if error:
+        return jsonify({"error": error}), 400
 
-# Secure calculate route using ast.literal_eval instead of eval
+    stream_format = params.get('format')
+    if stream_format is None:
+        stream_format = 'sse' if request.accept_mimetypes.best == 'text/event-stream' else 'ndjson'
+    if stream_format not in ('ndjson', 'sse'):
+        return jsonify({"error": "Invalid format"}), 400
+
+    def generate():
+        probed = reachable = 0
+        for result in probe_engine.probe_many(targets, **options):
+            probed += 1
+            reachable += result['reachable']
+            if stream_format == 'sse':
+                yield f"event: result\ndata: {json.dumps(result)}\n\n"
+            else:
+                yield json.dumps(result) + "\n"
+        summary = {"done": True, "probed": probed, "reachable": reachable}
+        if stream_format == 'sse':
+            yield f"event: done\ndata: {json.dumps(summary)}\n\n"
+        else:
+            yield json.dumps(summary) + "\n"
+
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Calculate route using a whitelisted, cost-bounded and cached arithmetic evaluator
 @app.route('/calculate')
+@calculate_admission
 def calculate():
     expression = request.args.get('expr')
     try:
-        result = ast.literal_eval(expression)
+        result = evaluate_expression(expression)
         return str(result)
-    except (SyntaxError, ValueError):
-        return jsonify({"error": "Invalid expression"}), 400
+    except CalculationError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Batch calculate: one expression with named variables over column-oriented inputs, evaluated with NumPy
+@app.route('/calculate/batch', methods=['POST'])
+@calculate_admission
+def calculate_batch_route():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    try:
+        results = calculate_batch(body.get('expr'), body.get('inputs', {}), MAX_BATCH_ROWS)
+    except CalculationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get('format') == 'f64':
+        # Raw little-endian float64 values, 8 bytes per row
+        return Response(results.astype('<f8').tobytes(), mimetype='application/octet-stream',
+                        headers={'X-Rows': str(len(results))})
+    import numpy as np
+
+    # JSON has no inf/nan, so non-finite values are returned as null
+    values = results.tolist()
+    if not np.isfinite(results).all():
+        values = [value if math.isfinite(value) else None for value in values]
+    return Response(json.dumps({"count": len(values), "results": values}, separators=(',', ':')),
+                    mimetype='application/json')
+
+# Queue depth, shed counts and cache statistics for monitoring
+@app.route('/stats')
+def stats():
+    return jsonify({
+        "admission": {
+            ping_admission.name: ping_admission.stats(),
+            calculate_admission.name: calculate_admission.stats(),
+        },
+        "probe_cache": probe_engine.cache.stats() if probe_engine.cache is not None else None,
+        "calculate_cache": compile_expression.cache_info()._asdict(),
+    })
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5000)  # Bind to localhost instead of all interfaces
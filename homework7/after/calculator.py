@@ -0,0 +1,265 @@
+import ast
+import math
+import operator
+import os
+from functools import lru_cache
+
+# Cost bounds, overridable from the environment
+MAX_EXPRESSION_LENGTH = int(os.environ.get('CALC_MAX_LENGTH', '500'))
+MAX_NODES = int(os.environ.get('CALC_MAX_NODES', '100'))
+MAX_EXPONENT = int(os.environ.get('CALC_MAX_EXPONENT', '1000'))
+MAX_INT_BITS = int(os.environ.get('CALC_MAX_INT_BITS', '4096'))
+CACHE_SIZE = int(os.environ.get('CALC_CACHE_SIZE', '1024'))
+
+
+class CalculationError(ValueError):
+    """Raised for expressions that are malformed, not allowed, or too expensive."""
+
+
+def _check_result(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalculationError(f"Result exceeds {MAX_INT_BITS} bits")
+    # Float arithmetic overflows to inf (or inf - inf to nan) instead of raising
+    if isinstance(value, float) and not math.isfinite(value):
+        raise CalculationError("Result out of range")
+    return value
+
+
+def _add(a, b):
+    return _check_result(a + b)
+
+
+def _sub(a, b):
+    return _check_result(a - b)
+
+
+def _mul(a, b):
+    if isinstance(a, int) and isinstance(b, int) and a.bit_length() + b.bit_length() > MAX_INT_BITS + 1:
+        raise CalculationError(f"Result exceeds {MAX_INT_BITS} bits")
+    return _check_result(a * b)
+
+
+def _div(a, b):
+    return _check_result(a / b)
+
+
+def _floordiv(a, b):
+    return _check_result(a // b)
+
+
+def _mod(a, b):
+    return _check_result(a % b)
+
+
+def _pow(base, exponent):
+    if abs(exponent) > MAX_EXPONENT:
+        raise CalculationError(f"Exponent larger than {MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        # Estimate the result size before computing it, so 9**9**9 is rejected cheaply
+        if abs(base) > 1 and (abs(base).bit_length() - 1) * exponent > MAX_INT_BITS:
+            raise CalculationError(f"Result exceeds {MAX_INT_BITS} bits")
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise CalculationError("Result is not a real number")
+    return _check_result(result)
+
+
+BINARY_OPERATORS = {
+    ast.Add: _add,
+    ast.Sub: _sub,
+    ast.Mult: _mul,
+    ast.Div: _div,
+    ast.FloorDiv: _floordiv,
+    ast.Mod: _mod,
+    ast.Pow: _pow,
+}
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+VECTOR_OPERATORS = {
+    ast.Add: 'add',
+    ast.Sub: 'subtract',
+    ast.Mult: 'multiply',
+    ast.Div: 'true_divide',
+    ast.FloorDiv: 'floor_divide',
+    ast.Mod: 'mod',
+    ast.Pow: 'power',
+}
+VECTOR_UNARY_OPERATORS = {
+    ast.UAdd: 'positive',
+    ast.USub: 'negative',
+}
+
+
+class CompiledExpression:
+    """A validated expression compiled to a tree of closures over a variable mapping."""
+
+    def __init__(self, text, tree, evaluate, variables):
+        self.text = text
+        self.tree = tree
+        self.variables = variables
+        self._evaluate = evaluate
+        self._vectorized = None
+        # Expressions without variables are folded once, at compile time
+        self.constant = not variables
+        self.value = evaluate({}) if self.constant else None
+
+    def evaluate(self, variables=None):
+        if self.constant:
+            return self.value
+        missing = [name for name in self.variables if name not in (variables or {})]
+        if missing:
+            raise CalculationError(f"Unknown variable: {', '.join(missing)}")
+        return self._evaluate(variables)
+
+    def evaluate_batch(self, columns):
+        """Evaluate over NumPy arrays (one per variable) with element-wise array operations."""
+        if self._vectorized is None:
+            self._vectorized = _compile_vectorized(self.tree)
+        return self._vectorized(columns)
+
+
+def _compile_node(node, variables):
+    """Return a closure for one whitelisted AST node, collecting variable names."""
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CalculationError("Only numbers are allowed")
+        _check_result(value)
+        return lambda env: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name.startswith('_'):
+            raise CalculationError(f"Invalid variable name: {name}")
+        variables.add(name)
+        return lambda env: env[name]
+
+    if isinstance(node, ast.BinOp):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"Operator {type(node.op).__name__} is not allowed")
+        left = _compile_node(node.left, variables)
+        right = _compile_node(node.right, variables)
+        return lambda env: op(left(env), right(env))
+
+    if isinstance(node, ast.UnaryOp):
+        op = UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"Operator {type(node.op).__name__} is not allowed")
+        operand = _compile_node(node.operand, variables)
+        return lambda env: op(operand(env))
+
+    raise CalculationError(f"{type(node).__name__} is not allowed")
+
+
+def _compile_vectorized(tree):
+    """Compile an already validated tree to closures over NumPy ufuncs."""
+    import numpy as np
+
+    def build(node):
+        if isinstance(node, ast.Constant):
+            value = np.float64(node.value)
+            return lambda columns: value
+        if isinstance(node, ast.Name):
+            name = node.id
+            return lambda columns: columns[name]
+        if isinstance(node, ast.BinOp):
+            op = getattr(np, VECTOR_OPERATORS[type(node.op)])
+            left, right = build(node.left), build(node.right)
+            return lambda columns: op(left(columns), right(columns))
+        op = getattr(np, VECTOR_UNARY_OPERATORS[type(node.op)])
+        operand = build(node.operand)
+        return lambda columns: op(operand(columns))
+
+    evaluate = build(tree.body)
+
+    def run(columns):
+        # Division by zero and overflow give inf/nan per element instead of failing the batch
+        with np.errstate(all='ignore'):
+            return np.asarray(evaluate(columns), dtype=np.float64)
+    return run
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(text):
+    """Parse, validate and compile an expression; results are cached by expression text."""
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise CalculationError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        raise CalculationError("Invalid expression")
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise CalculationError(f"Expression has more than {MAX_NODES} nodes")
+
+    variables = set()
+    evaluate = _compile_node(tree.body, variables)
+    try:
+        return CompiledExpression(text, tree, evaluate, tuple(sorted(variables)))
+    except ZeroDivisionError:
+        raise CalculationError("Division by zero")
+    except OverflowError:
+        raise CalculationError("Result out of range")
+
+
+def calculate(text, variables=None):
+    """Evaluate an arithmetic expression such as '2*3+1'."""
+    if not isinstance(text, str) or not text:
+        raise CalculationError("Invalid expression")
+    try:
+        return compile_expression(text).evaluate(variables)
+    except ZeroDivisionError:
+        raise CalculationError("Division by zero")
+    except OverflowError:
+        raise CalculationError("Result out of range")
+
+
+def calculate_batch(text, inputs, max_rows):
+    """Evaluate one expression over column-oriented inputs, returning a float64 NumPy array.
+
+    `inputs` maps each variable to a list of numbers or a single number,
+    which is broadcast; all lists must have the same length.
+    """
+    import numpy as np
+
+    if not isinstance(text, str) or not text:
+        raise CalculationError("Invalid expression")
+    if not isinstance(inputs, dict):
+        raise CalculationError("inputs must map variable names to arrays")
+    compiled = compile_expression(text)
+
+    missing = [name for name in compiled.variables if name not in inputs]
+    unknown = [name for name in inputs if name not in compiled.variables]
+    if missing or unknown:
+        raise CalculationError(f"Inputs do not match variables {list(compiled.variables)}")
+
+    columns = {}
+    rows = None
+    for name, values in inputs.items():
+        if isinstance(values, list):
+            if len(values) > max_rows:
+                raise CalculationError(f"More than {max_rows} rows")
+            # asarray would quietly convert "3" and true, so every element is checked first
+            if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                raise CalculationError(f"Input {name} must be a list of numbers")
+        elif isinstance(values, bool) or not isinstance(values, (int, float)):
+            raise CalculationError(f"Input {name} must be a number or a list of numbers")
+        try:
+            column = np.asarray(values, dtype=np.float64)
+        except OverflowError:
+            raise CalculationError(f"Input {name} is out of range")
+        if column.ndim == 1:
+            if rows is not None and len(column) != rows:
+                raise CalculationError("All input arrays must have the same length")
+            rows = len(column)
+        columns[name] = column
+
+    rows = 1 if rows is None else rows
+    if rows > max_rows:
+        raise CalculationError(f"More than {max_rows} rows")
+    result = compiled.evaluate_batch(columns)
+    return np.broadcast_to(result, (rows,))
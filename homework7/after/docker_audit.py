@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+# Bump when a rule changes so cached results from older rules are not reused
+RULES_VERSION = 2
+CACHE_PATH = '.docker_audit_cache.json'
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__', '.venv', 'venv', '.tox'}
+COMPOSE_NAMES = {'docker-compose.yml', 'docker-compose.yaml', 'compose.yml', 'compose.yaml'}
+ROOT_USERS = {'root', '0'}
+
+
+def file_kind(name):
+    """Return 'dockerfile', 'compose' or None for a file name."""
+    lower = name.lower()
+    if lower == 'dockerfile' or lower.startswith('dockerfile.') or lower.endswith('.dockerfile'):
+        return 'dockerfile'
+    if lower in COMPOSE_NAMES or (lower.startswith('docker-compose') and lower.endswith(('.yml', '.yaml'))):
+        return 'compose'
+    return None
+
+
+def find_files(root):
+    """Yield (path, kind) for every Dockerfile and compose file under root."""
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            kind = file_kind(name)
+            if kind:
+                yield os.path.join(directory, name), kind
+
+
+def finding(rule, passed, detail, service=None, line=None):
+    return {'rule': rule, 'passed': passed, 'detail': detail, 'service': service, 'line': line}
+
+
+def parse_dockerfile(text):
+    """Return (line_number, INSTRUCTION, arguments) with comments dropped and continuations joined."""
+    instructions = []
+    buffer, start = [], None
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not buffer and (not line or line.startswith('#')):
+            continue
+        if buffer and line.startswith('#'):
+            continue
+        if start is None:
+            start = number
+        if line.endswith('\\'):
+            buffer.append(line[:-1])
+            continue
+        buffer.append(line)
+        joined = ' '.join(part.strip() for part in buffer if part.strip())
+        instruction, _, arguments = joined.partition(' ')
+        instructions.append((start, instruction.upper(), arguments.strip()))
+        buffer, start = [], None
+    return instructions
+
+
+def audit_dockerfile(text):
+    """Check the final build stage for a non-root USER and a HEALTHCHECK."""
+    instructions = parse_dockerfile(text)
+    # Only the last stage ends up in the image; earlier stages are build scaffolding
+    stage_start = max((i for i, (_, instruction, _) in enumerate(instructions) if instruction == 'FROM'), default=0)
+    stage = instructions[stage_start:]
+
+    users = [(number, arguments) for number, instruction, arguments in stage if instruction == 'USER']
+    if not users:
+        user_finding = finding('non-root-user', False, 'No USER instruction; the container runs as root')
+    else:
+        number, user = users[-1]
+        name = user.split(':')[0].strip()
+        if name in ROOT_USERS:
+            user_finding = finding('non-root-user', False, f'USER {user} is root', line=number)
+        else:
+            user_finding = finding('non-root-user', True, f'USER {user}', line=number)
+
+    checks = [(number, arguments) for number, instruction, arguments in stage if instruction == 'HEALTHCHECK']
+    if not checks:
+        health_finding = finding('healthcheck', False, 'No HEALTHCHECK instruction')
+    elif checks[-1][1].upper() == 'NONE':
+        health_finding = finding('healthcheck', False, 'HEALTHCHECK NONE disables health checks', line=checks[-1][0])
+    else:
+        health_finding = finding('healthcheck', True, 'HEALTHCHECK present', line=checks[-1][0])
+    return [user_finding, health_finding]
+
+
+def audit_service(name, service):
+    limits = ((service.get('deploy') or {}).get('resources') or {}).get('limits') or {}
+    security_opt = [str(option).replace('=', ':').replace(' ', '') for option in service.get('security_opt') or []]
+    no_new_privileges = any(option in ('no-new-privileges', 'no-new-privileges:true') for option in security_opt)
+    memory = service.get('mem_limit') or limits.get('memory')
+    pids = service.get('pids_limit') or limits.get('pids')
+    try:
+        # -1 or 0 means unlimited
+        pids_limited = int(pids) > 0
+    except (TypeError, ValueError):
+        pids_limited = False
+    return [
+        finding('no-new-privileges', no_new_privileges,
+                'security_opt sets no-new-privileges' if no_new_privileges else 'security_opt lacks no-new-privileges:true',
+                service=name),
+        finding('read_only', service.get('read_only') is True,
+                'Root filesystem is read-only' if service.get('read_only') is True else 'read_only is not true',
+                service=name),
+        finding('mem_limit', bool(memory), f'Memory limit {memory}' if memory else 'No memory limit', service=name),
+        finding('pids_limit', pids_limited, f'PID limit {pids}' if pids_limited else 'No PID limit', service=name),
+    ]
+
+
+def audit_compose(text):
+    """Check every service in a compose file."""
+    try:
+        data = yaml.safe_load(text) or {}
+    except yaml.YAMLError as e:
+        return [finding('parse', False, f'Invalid YAML: {e}')]
+    services = data.get('services') if isinstance(data, dict) else None
+    if not isinstance(services, dict):
+        return [finding('parse', False, 'No services defined')]
+    findings = []
+    for name, service in services.items():
+        if not isinstance(service, dict):
+            findings.append(finding('parse', False, 'Service is not a mapping', service=name))
+            continue
+        findings.extend(audit_service(name, service))
+    return findings
+
+
+AUDITORS = {'dockerfile': audit_dockerfile, 'compose': audit_compose}
+
+
+def audit_content(kind, content):
+    """Worker entry point: audit one file's bytes."""
+    return AUDITORS[kind](content.decode('utf-8', 'replace'))
+
+
+def load_cache(path):
+    """Return (results by content key, content keys by scanned root) from the cache file."""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    if cache.get('rules_version') != RULES_VERSION:
+        return {}, {}
+    return cache.get('results', {}), cache.get('roots', {})
+
+
+def save_cache(path, results, roots):
+    # Only results still referenced by some scanned root are kept
+    referenced = {key for keys in roots.values() for key in keys}
+    results = {key: findings for key, findings in results.items() if key in referenced}
+    with open(path, 'w') as f:
+        json.dump({'rules_version': RULES_VERSION, 'results': results, 'roots': roots}, f)
+
+
+def audit_tree(root, cache_path=CACHE_PATH, workers=None, use_cache=True):
+    """Audit every file under root, re-checking only files whose content hash is not cached."""
+    cache, roots = load_cache(cache_path) if use_cache else ({}, {})
+    files = []
+    pending = {}
+    for path, kind in find_files(root):
+        with open(path, 'rb') as f:
+            content = f.read()
+        # Keyed by content, so identical files across repos are only checked once
+        key = f"{kind}:{hashlib.sha256(content).hexdigest()}"
+        files.append((path, kind, key))
+        if key not in cache and key not in pending:
+            pending[key] = (kind, content)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {key: pool.submit(audit_content, kind, content) for key, (kind, content) in pending.items()}
+            for key, future in futures.items():
+                cache[key] = future.result()
+
+    report = [{'path': os.path.relpath(path, root), 'kind': kind, 'cached': key not in pending,
+               'findings': cache[key]} for path, kind, key in files]
+    if use_cache:
+        # Replace this root's content list; entries of other roots sharing the cache file are kept
+        roots[os.path.abspath(root)] = sorted({key for _, _, key in files})
+        save_cache(cache_path, cache, roots)
+    return report
+
+
+def summarize(report):
+    summary = {}
+    for entry in report:
+        for item in entry['findings']:
+            counts = summary.setdefault(item['rule'], {'passed': 0, 'failed': 0})
+            counts['passed' if item['passed'] else 'failed'] += 1
+    return summary
+
+
+def print_report(report, show_passed=False):
+    for entry in report:
+        failures = [item for item in entry['findings'] if not item['passed']]
+        status = '✓' if not failures else '✗'
+        cached = ' (cached)' if entry['cached'] else ''
+        print(f"{status} {entry['path']} [{entry['kind']}]{cached}")
+        for item in entry['findings']:
+            if item['passed'] and not show_passed:
+                continue
+            where = f"service {item['service']}: " if item['service'] else ''
+            line = f" (line {item['line']})" if item['line'] else ''
+            print(f"    {'✓' if item['passed'] else '✗'} {item['rule']}: {where}{item['detail']}{line}")
+
+    print("=" * 50)
+    print(f"{'rule':<20}{'passed':>8}{'failed':>8}")
+    for rule, counts in summarize(report).items():
+        print(f"{rule:<20}{counts['passed']:>8}{counts['failed']:>8}")
+    checked = sum(1 for entry in report if not entry['cached'])
+    print(f"{len(report)} files audited, {checked} checked, {len(report) - checked} from cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit Dockerfiles and compose files for hardening settings")
+    parser.add_argument("root", nargs="?", default=".", help="directory to walk")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: one per core)")
+    parser.add_argument("--cache", default=CACHE_PATH, help="cache file (default: %(default)s in the current directory)")
+    parser.add_argument("--no-cache", action="store_true", help="re-check every file")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    parser.add_argument("--show-passed", action="store_true", help="list passing checks too")
+    args = parser.parse_args()
+
+    # The cache lives outside the audited tree, which is only read
+    report = audit_tree(args.root, args.cache, args.workers, use_cache=not args.no_cache)
+    print_report(report, args.show_passed)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'root': os.path.abspath(args.root), 'files': report, 'summary': summarize(report)}, f, indent=2)
+    sys.exit(1 if any(not item['passed'] for entry in report for item in entry['findings']) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import asyncio
+import concurrent.futures
+import ipaddress
+import itertools
+import os
+from collections import OrderedDict
+import socket
+import struct
+import threading
+import time
+
+# Probe limits, overridable from the environment
+MAX_CONCURRENT_PROBES = int(os.environ.get('PROBE_MAX_CONCURRENCY', '64'))
+DEFAULT_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', '2.0'))
+MAX_TIMEOUT = 5.0
+DEFAULT_TCP_PORT = 80
+BATCH_WINDOW = int(os.environ.get('PROBE_BATCH_WINDOW', '32'))
+CACHE_TTL = float(os.environ.get('PROBE_CACHE_TTL', '5'))
+CACHE_STALE_TTL = float(os.environ.get('PROBE_CACHE_STALE_TTL', '30'))
+CACHE_MAX_ENTRIES = int(os.environ.get('PROBE_CACHE_MAX_ENTRIES', '1024'))
+PROBE_METHODS = ('auto', 'icmp', 'tcp')
+
+ICMP_ECHO_REQUEST = {4: 8, 6: 128}
+ICMP_ECHO_REPLY = {4: 0, 6: 129}
+
+
+def icmp_checksum(data):
+    """RFC 1071 ones' complement checksum."""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+class ProbeCache:
+    """LRU cache of probe results with a TTL and a stale-while-revalidate window.
+
+    Only touched from the engine's event loop thread, so it needs no locking.
+    Within `ttl` a result is served as is; for a further `stale_ttl` it is
+    still served but a background probe refreshes it. Concurrent misses for
+    the same key share one in-flight probe.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key, factory):
+        """Return the cached result for key, probing via factory() when needed."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            result, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                annotated = dict(result, cached=True, age_s=round(age, 3))
+                if age < self.ttl:
+                    self.hits += 1
+                    return annotated
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    task = self._start(key, factory)
+                    # Nobody awaits a background refresh; retrieve its exception so it isn't logged
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                annotated['stale'] = True
+                return annotated
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._start(key, factory)
+        else:
+            self.coalesced += 1
+        # Shield so one cancelled waiter doesn't cancel the probe the others share
+        return dict(await asyncio.shield(task), cached=False)
+
+    def _start(self, key, factory):
+        task = asyncio.get_running_loop().create_task(self._fill(key, factory))
+        self._inflight[key] = task
+        return task
+
+    async def _fill(self, key, factory):
+        try:
+            result = await factory()
+            self._entries[key] = (result, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+        }
+
+
+class ProbeEngine:
+    """Runs reachability probes on a private asyncio loop in one background thread.
+
+    A single semaphore bounds the number of probes in flight across all
+    requests, so a burst of /ping calls queues instead of forking a process
+    (and a pid) per request.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_PROBES, default_timeout=DEFAULT_TIMEOUT, cache=None):
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.cache = cache
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        # Per IP version: a host can have ICMP sockets for IPv4 but no IPv6 at all
+        self._icmp_available = {4: None, 6: None}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                started.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name='probe-engine', daemon=True).start()
+            started.wait()
+            self._loop = loop
+            return loop
+
+    def submit(self, ip, method='auto', port=DEFAULT_TCP_PORT, timeout=None, use_cache=True):
+        """Schedule a probe and return a concurrent.futures.Future for its result dict."""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self.probe_async(ip, method, port, timeout, use_cache), loop)
+
+    def probe(self, ip, method='auto', port=DEFAULT_TCP_PORT, timeout=None, use_cache=True):
+        """Probe one target, blocking the calling thread until the result is ready."""
+        return self.submit(ip, method, port, timeout, use_cache).result()
+
+    def probe_many(self, targets, method='auto', port=DEFAULT_TCP_PORT, timeout=None, window=BATCH_WINDOW):
+        """Probe an iterable of targets, yielding each result dict as soon as it completes.
+
+        At most `window` probes are submitted at a time and targets are pulled
+        lazily from the iterable, so memory stays flat however large the range.
+        """
+        targets = iter(targets)
+        pending = set()
+        try:
+            while True:
+                while len(pending) < window:
+                    target = next(targets, None)
+                    if target is None:
+                        break
+                    # Sweeps bypass the cache so they don't evict the hot dashboard targets
+                    pending.add(self.submit(str(target), method, port, timeout, use_cache=False))
+                if not pending:
+                    return
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # Client went away or the caller stopped early: drop the probes still queued
+            for future in pending:
+                future.cancel()
+
+    async def probe_async(self, ip, method='auto', port=DEFAULT_TCP_PORT, timeout=None, use_cache=True):
+        """Probe one target from code already running on the engine's loop."""
+        address = ipaddress.ip_address(ip)
+        timeout = min(timeout or self.default_timeout, MAX_TIMEOUT)
+        if use_cache and self.cache is not None:
+            # The timeout is part of the key: a short-timeout "unreachable" says nothing about a longer wait
+            key = (str(address), method, port if method != 'icmp' else None, timeout)
+            return await self.cache.get(key, lambda: self._run_probe(address, method, port, timeout))
+        return await self._run_probe(address, method, port, timeout)
+
+    async def _run_probe(self, address, method, port, timeout):
+        fallback = method == 'auto'
+        if fallback:
+            method = 'icmp' if self._icmp_available[address.version] is not False else 'tcp'
+
+        async with self._semaphore:
+            if method == 'icmp':
+                try:
+                    result = await self._icmp_probe(address, timeout)
+                    self._icmp_available[address.version] = True
+                    return result
+                except OSError as e:
+                    # The ICMP socket couldn't be created: no net.ipv4.ping_group_range permission
+                    # (EACCES), or no ICMP / IPv6 support at all (EPROTONOSUPPORT, EAFNOSUPPORT)
+                    if not fallback:
+                        return {'ip': str(address), 'method': 'icmp', 'reachable': False, 'rtt_ms': None,
+                                'error': f"ICMP unavailable: {e.strerror or e}"}
+                    self._icmp_available[address.version] = False
+            return await self._tcp_probe(address, port, timeout)
+
+    async def _tcp_probe(self, address, port, timeout):
+        result = {'ip': str(address), 'method': 'tcp', 'port': port, 'reachable': False, 'rtt_ms': None}
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(str(address), port), timeout)
+            writer.close()
+            result['reachable'] = True
+        except ConnectionRefusedError:
+            # A RST still proves the host is up
+            result['reachable'] = True
+            result['detail'] = 'port closed'
+        except asyncio.TimeoutError:
+            result['detail'] = 'timeout'
+            return result
+        except OSError as e:
+            result['detail'] = e.strerror or str(e)
+            return result
+        result['rtt_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return result
+
+    async def _icmp_probe(self, address, timeout):
+        loop = asyncio.get_running_loop()
+        version = address.version
+        family, proto = (socket.AF_INET, socket.IPPROTO_ICMP) if version == 4 else (socket.AF_INET6, socket.IPPROTO_ICMPV6)
+        sequence = next(self._sequence) & 0xffff
+        payload = struct.pack('!d', time.time())
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST[version], 0, 0, 0, sequence)
+        # The kernel rewrites the identifier (and the v6 checksum) on datagram ICMP sockets
+        packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST[version], 0, icmp_checksum(header + payload), 0, sequence) + payload
+
+        result = {'ip': str(address), 'method': 'icmp', 'reachable': False, 'rtt_ms': None}
+        sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+        try:
+            sock.setblocking(False)
+            start = time.perf_counter()
+            deadline = start + timeout
+            try:
+                await loop.sock_sendto(sock, packet, (str(address), 0))
+            except OSError as e:
+                result['detail'] = e.strerror or str(e)
+                return result
+
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    result['detail'] = 'timeout'
+                    return result
+                try:
+                    data = await asyncio.wait_for(loop.sock_recv(sock, 1024), remaining)
+                except asyncio.TimeoutError:
+                    result['detail'] = 'timeout'
+                    return result
+                except OSError as e:
+                    result['detail'] = e.strerror or str(e)
+                    return result
+                if len(data) >= 8:
+                    reply_type, _, _, _, reply_sequence = struct.unpack('!BBHHH', data[:8])
+                    if reply_type == ICMP_ECHO_REPLY[version] and reply_sequence == sequence:
+                        result['reachable'] = True
+                        result['rtt_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                        return result
+        finally:
+            sock.close()
+
+
+probe_engine = ProbeEngine(cache=ProbeCache() if CACHE_TTL > 0 else None)
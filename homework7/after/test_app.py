@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+# Admission limits are read at import; keep the per-client rate limit out of the way
+os.environ['RATE_LIMIT_PER_SEC'] = '0'
+
+from app import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('expr', [123, ['x'], {'x': 1}, None, ''])
+def test_calculate_batch_rejects_non_string_expr(client, expr):
+    response = client.post('/calculate/batch', json={'expr': expr, 'inputs': {'x': [1, 2]}})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid expression'}
+
+
+@pytest.mark.parametrize('inputs', [{'x': [1, '3']}, {'x': [1, True]}, {'x': True}, {'x': [[1, 2]]}])
+def test_calculate_batch_rejects_non_numeric_inputs(client, inputs):
+    response = client.post('/calculate/batch', json={'expr': 'x*2', 'inputs': inputs})
+    assert response.status_code == 400
+
+
+def test_calculate_batch(client):
+    response = client.post('/calculate/batch', json={'expr': 'x/y', 'inputs': {'x': [1, 2], 'y': [0, 2]}})
+    assert response.status_code == 200
+    assert response.get_json() == {'count': 2, 'results': [None, 1.0]}
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'ips', 5])
+def test_ping_batch_rejects_non_object_body(client, body):
+    response = client.post('/ping/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Expected a JSON object'}
+
+
+@pytest.mark.parametrize('ips', [[1], ['127.0.0.1', 2130706433], [None], [['127.0.0.1']]])
+def test_ping_batch_rejects_non_string_ips(client, ips):
+    response = client.post('/ping/batch', json={'ips': ips})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid IP address'}
+
+
+def test_ping_batch_rejects_non_string_cidr(client):
+    response = client.post('/ping/batch', json={'cidr': 2130706433})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid CIDR'}
+
+
+def test_ping_batch_streams_results(client):
+    response = client.post('/ping/batch', json={'ips': ['127.0.0.1'], 'method': 'tcp', 'timeout': 1})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[0]['ip'] == '127.0.0.1'
+    assert lines[-1] == {'done': True, 'probed': 1, 'reachable': lines[0]['reachable']}
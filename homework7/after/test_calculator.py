@@ -0,0 +1,22 @@
+import math
+
+import pytest
+
+from calculator import CalculationError, calculate
+
+
+@pytest.mark.parametrize('expr', ['1e308*10', '1e308+1e308', '-1e308-1e308', '1e308/1e-10', '1e308//1e-10', '1e999'])
+def test_float_overflow_is_rejected(expr):
+    with pytest.raises(CalculationError, match='Result out of range'):
+        calculate(expr)
+
+
+@pytest.mark.parametrize('expr', ['x // 1', 'x % 2'])
+def test_floordiv_and_mod_reject_non_finite_results(expr):
+    with pytest.raises(CalculationError, match='Result out of range'):
+        calculate(expr, {'x': math.inf})
+
+
+@pytest.mark.parametrize('expr, expected', [('7 // 2', 3), ('-7 // 2', -4), ('7 % 3', 1), ('7.5 % 2', 1.5)])
+def test_floordiv_and_mod(expr, expected):
+    assert calculate(expr) == expected
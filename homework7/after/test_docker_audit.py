@@ -0,0 +1,52 @@
+import json
+
+from docker_audit import audit_tree
+
+COMPOSE = "services:\n  web:\n    image: nginx\n    read_only: {read_only}\n"
+
+
+def write_repo(path, read_only='true'):
+    path.mkdir()
+    (path / 'docker-compose.yml').write_text(COMPOSE.format(read_only=read_only))
+    (path / 'Dockerfile').write_text(f"FROM python:3.11\nUSER app\n# {path.name}\n")
+    return path
+
+
+def test_cache_keeps_other_roots(tmp_path):
+    cache = str(tmp_path / 'cache.json')
+    first = write_repo(tmp_path / 'first')
+    second = write_repo(tmp_path / 'second', read_only='false')
+
+    audit_tree(str(first), cache, workers=1)
+    audit_tree(str(second), cache, workers=1)
+    # The identical compose file is shared, each Dockerfile differs by its comment
+    assert all(entry['cached'] for entry in audit_tree(str(first), cache, workers=1))
+    assert all(entry['cached'] for entry in audit_tree(str(second), cache, workers=1))
+
+
+def test_cache_drops_stale_content_of_the_scanned_root_only(tmp_path):
+    cache = str(tmp_path / 'cache.json')
+    first = write_repo(tmp_path / 'first')
+    second = write_repo(tmp_path / 'second')
+    audit_tree(str(first), cache, workers=1)
+    audit_tree(str(second), cache, workers=1)
+    with open(cache) as f:
+        before = set(json.load(f)['results'])
+
+    (first / 'Dockerfile').write_text("FROM python:3.11\n")
+    report = audit_tree(str(first), cache, workers=1)
+    assert {entry['path']: entry['cached'] for entry in report} == {'Dockerfile': False, 'docker-compose.yml': True}
+    with open(cache) as f:
+        after = set(json.load(f)['results'])
+    # Only the old Dockerfile of the re-scanned root is gone
+    assert len(before - after) == 1 and len(after - before) == 1
+    assert all(entry['cached'] for entry in audit_tree(str(second), cache, workers=1))
+
+
+def test_non_mapping_services_are_reported(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    (repo / 'compose.yml').write_text("services:\n  web:\n  db: [1]\n")
+    [entry] = audit_tree(str(repo), use_cache=False, workers=1)
+    assert [(item['rule'], item['service'], item['passed']) for item in entry['findings']] == [
+        ('parse', 'web', False), ('parse', 'db', False)]
@@ -1,13 +1,45 @@
 from flask import Flask, request, jsonify, session, redirect, render_template, url_for
-import jwt
 import time
-import requests
 import os
-from functools import wraps
+import hashlib
+import importlib
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache, wraps
 from urllib.parse import urlencode
 import base64
 import secrets
 
+from request_profiler import RequestProfiler
+from request_tracing import Tracer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class LazyModule:
+    """Stands in for a module-level import and imports the module on first attribute access"""
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+        
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+# requests and jwt (which pulls in cryptography) are a third of the import time,
+# and neither is needed until the first Keycloak call or token
+requests = LazyModule('requests')
+jwt = LazyModule('jwt')
+
 app = Flask(__name__)
 app.secret_key = 'demo-secret-key-change-in-production'
 
@@ -23,86 +55,489 @@ KEYCLOAK_AUTH_URL = f"{KEYCLOAK_URL}/realms/{REALM_NAME}/protocol/openid-connect
 KEYCLOAK_TOKEN_URL = f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM_NAME}/protocol/openid-connect/token"
 KEYCLOAK_USERINFO_URL = f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM_NAME}/protocol/openid-connect/userinfo"
 KEYCLOAK_CERTS_URL = f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM_NAME}/protocol/openid-connect/certs"
+KEYCLOAK_DISCOVERY_URL = f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM_NAME}/.well-known/openid-configuration"
 
-def get_keycloak_public_key():
-    """Get Keycloak public key for token validation"""
-    try:
-        response = requests.get(KEYCLOAK_CERTS_URL)
-        if response.status_code == 200:
-            keys = response.json()['keys']
-            # Return first key for simplicity (in production, match by kid)
-            return keys[0] if keys else None
-        return None
-    except Exception as e:
-        print(f"Error getting Keycloak public key: {e}")
-        return None
+KEYCLOAK_ISSUERS = (f"{KEYCLOAK_URL}/realms/{REALM_NAME}", f"{KEYCLOAK_INTERNAL_URL}/realms/{REALM_NAME}")
 
-def validate_keycloak_token(token):
-    """Validate Keycloak JWT token"""
-    try:
-        # Remove Bearer prefix if present
-        if token.startswith('Bearer '):
-            token = token[7:]
+# Tracing (off unless TRACE_EXPORT_FILE or TRACE_EXPORT_URL is set)
+tracer = Tracer.from_env('keycloak-iam-system')
+tracer.install(app)
+
+def keycloak_request(method, url, operation, **kwargs):
+    """Call Keycloak inside a client span, passing the trace on in a traceparent header"""
+    with tracer.span(f"keycloak.{operation}", kind='client', **{'http.method': method, 'http.url': url}) as span:
+        kwargs['headers'] = tracer.inject(kwargs.get('headers'))
+        send = requests.get if method == 'GET' else requests.post
+        response = send(url, **kwargs)
+        span.set_attribute('http.status_code', response.status_code)
+        return response
+
+# Bearer token verification
+MAX_CACHED_CLAIMS = 4096
+JWKS_REFRESH_INTERVAL = 30
+
+class TokenVerifier(ABC):
+    """Verifies one kind of bearer token; registered with the TokenVerifierRegistry"""
+    
+    name = None
+    algorithms = ()
+    issuers = ()
+    
+    @abstractmethod
+    def verify(self, token, header):
+        """Return the token's claims or raise jwt.InvalidTokenError"""
+
+class SimpleJWTVerifier(TokenVerifier):
+    """HS256 tokens issued by /api/login, signed with the app's secret key"""
+    
+    name = 'simple'
+    algorithms = ('HS256',)
+    
+    def verify(self, token, header):
+        return jwt.decode(token, app.secret_key, algorithms=list(self.algorithms))
+
+class KeycloakVerifier(TokenVerifier):
+    """RS256 access tokens from the Keycloak realm, checked locally against its JWKS"""
+    
+    name = 'keycloak'
+    algorithms = ('RS256',)
+    issuers = KEYCLOAK_ISSUERS
+    
+    def __init__(self):
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
         
-        # For development, we'll validate against Keycloak's userinfo endpoint
-        headers = {'Authorization': f'Bearer {token}'}
-        response = requests.get(KEYCLOAK_USERINFO_URL, headers=headers)
+    def fetch_keys(self):
+        response = keycloak_request('GET', KEYCLOAK_CERTS_URL, 'jwks', timeout=5)
+        if response.status_code != 200:
+            raise ValueError(f"JWKS request failed with HTTP {response.status_code}")
+        keys = {}
+        for jwk in response.json()['keys']:
+            if jwk.get('use', 'sig') == 'sig' and jwk.get('alg', 'RS256') in self.algorithms:
+                keys[jwk.get('kid')] = jwt.PyJWK(jwk).key
+        return keys
         
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return None
-    except Exception as e:
-        print(f"Token validation error: {e}")
-        return None
+    def refresh_keys(self):
+        # Failed fetches count too, so an unreachable Keycloak isn't asked on every request
+        self._fetched_at = time.monotonic()
+        self._keys = self.fetch_keys()
+        return self._keys
+        
+    def signing_key(self, kid):
+        """Public key for kid; an unknown kid refetches the JWKS, at most every JWKS_REFRESH_INTERVAL"""
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        with self._lock:
+            key = self._keys.get(kid)
+            if key is None and time.monotonic() - self._fetched_at >= JWKS_REFRESH_INTERVAL:
+                try:
+                    self.refresh_keys()
+                except Exception as e:
+                    print(f"Error getting Keycloak public keys: {e}")
+                key = self._keys.get(kid)
+        if key is None and kid is None and self._keys:
+            # Token without a kid: fall back to the first key
+            key = next(iter(self._keys.values()))
+        if key is None:
+            raise jwt.InvalidTokenError(f"No signing key for kid {kid!r}")
+        return key
+        
+    def verify(self, token, header):
+        claims = jwt.decode(token, self.signing_key(header.get('kid')), algorithms=list(self.algorithms),
+                            issuer=list(self.issuers), options={'verify_aud': False})
+        # ID and refresh tokens are signed with the same key but are not bearer tokens
+        if claims.get('typ', 'Bearer') != 'Bearer':
+            raise jwt.InvalidTokenError('Not an access token')
+        return claims
 
-def keycloak_token_required(f):
-    """Decorator to require valid Keycloak token"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
+class TokenVerifierRegistry:
+    """Dispatches a bearer token to its verifier by alg (and iss when algs overlap) and caches the claims
+    
+    Verified claims are kept per token until the token expires, so repeat
+    requests with the same token skip signature checks for every scheme.
+    """
+    
+    def __init__(self, max_cached=MAX_CACHED_CLAIMS):
+        self.verifiers = {}
+        self.max_cached = max_cached
+        self._by_alg = {}
+        self._claims = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {}
+        self.unrecognized = 0
         
-        if not token:
-            return jsonify({'error': 'Token missing'}), 401
+    def register(self, verifier):
+        self.verifiers[verifier.name] = verifier
+        for alg in verifier.algorithms:
+            self._by_alg.setdefault(alg, []).append(verifier)
+        self.metrics[verifier.name] = {'verified': 0, 'cache_hits': 0, 'expired': 0, 'invalid': 0}
+        return verifier
         
-        user_info = validate_keycloak_token(token)
-        if not user_info:
-            return jsonify({'error': 'Invalid or expired token'}), 401
+    def resolve(self, token, header):
+        candidates = self._by_alg.get(header.get('alg'), ())
+        if len(candidates) > 1:
+            issuer = jwt.decode(token, options={'verify_signature': False}).get('iss')
+            candidates = [verifier for verifier in candidates if issuer in verifier.issuers]
+        if len(candidates) != 1:
+            raise jwt.InvalidTokenError(f"No verifier for alg {header.get('alg')!r}")
+        return candidates[0]
         
-        request.user = user_info
-        return f(*args, **kwargs)
-    
-    return decorated
+    def count(self, scheme, outcome):
+        with self._lock:
+            self.metrics[scheme][outcome] += 1
+        
+    def snapshot(self):
+        with self._lock:
+            return {
+                'schemes': {name: dict(counts) for name, counts in self.metrics.items()},
+                'unrecognized': self.unrecognized,
+                'cached_claims': len(self._claims),
+            }
+        
+    def verify(self, token, schemes=None):
+        """Return (scheme, claims); raises jwt.ExpiredSignatureError or jwt.InvalidTokenError"""
+        with tracer.span('cache.claims') as span, self._lock:
+            cached = self._claims.get(token)
+            if cached is not None:
+                self._claims.move_to_end(token)
+            span.set_attribute('cache.hit', cached is not None)
+        if cached is not None:
+            scheme, claims, expires = cached
+            if expires is not None and expires <= time.time():
+                with self._lock:
+                    self._claims.pop(token, None)
+                self.count(scheme, 'expired')
+                raise jwt.ExpiredSignatureError('Signature has expired')
+            if schemes and scheme not in schemes:
+                raise jwt.InvalidTokenError(f"{scheme} tokens are not accepted here")
+            self.count(scheme, 'cache_hits')
+            return scheme, claims
+        
+        try:
+            header = jwt.get_unverified_header(token)
+            verifier = self.resolve(token, header)
+        except jwt.InvalidTokenError:
+            with self._lock:
+                self.unrecognized += 1
+            raise
+        if schemes and verifier.name not in schemes:
+            raise jwt.InvalidTokenError(f"{verifier.name} tokens are not accepted here")
+        try:
+            with tracer.span(f"auth.verify.{verifier.name}", alg=header.get('alg')):
+                claims = verifier.verify(token, header)
+        except jwt.ExpiredSignatureError:
+            self.count(verifier.name, 'expired')
+            raise
+        except jwt.InvalidTokenError:
+            self.count(verifier.name, 'invalid')
+            raise
+        self.count(verifier.name, 'verified')
+        with self._lock:
+            self._claims[token] = (verifier.name, claims, claims.get('exp'))
+            while len(self._claims) > self.max_cached:
+                self._claims.popitem(last=False)
+        return verifier.name, claims
+
+token_verifiers = TokenVerifierRegistry()
+token_verifiers.register(SimpleJWTVerifier())
+token_verifiers.register(KeycloakVerifier())
+
+def bearer_token(header):
+    if header and header.startswith('Bearer '):
+        return header[7:]
+    return header
+
+def validate_keycloak_token(token):
+    """Validate Keycloak JWT token; returns its claims or None"""
+    try:
+        return token_verifiers.verify(bearer_token(token), ('keycloak',))[1]
+    except jwt.InvalidTokenError:
+        return None
+
+def token_required(*schemes):
+    """Decorator to require a valid bearer token of one of the given schemes (any registered scheme if none)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            token = bearer_token(request.headers.get('Authorization'))
+            
+            if not token:
+                return jsonify({'error': 'Token missing'}), 401
+            
+            try:
+                with tracer.span('auth.token_required') as span:
+                    request.auth_scheme, request.user = token_verifiers.verify(token, schemes)
+                    span.set_attribute('auth.scheme', request.auth_scheme)
+            except jwt.ExpiredSignatureError:
+                return jsonify({'error': 'Token expired'}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({'error': 'Invalid token'}), 401
+            
+            return f(*args, **kwargs)
+        
+        return decorated
+    return decorator
 
-def simple_token_required(f):
-    """Decorator for simple JWT tokens (backwards compatibility)"""
+keycloak_token_required = token_required('keycloak')
+simple_token_required = token_required('simple')
+
+def is_admin(claims):
+    """Admin role from either scheme: a simple JWT's role or a Keycloak realm role"""
+    return claims.get('role') == 'admin' or 'admin' in (claims.get('realm_access') or {}).get('roles', ())
+
+def admin_required(f):
+    """Decorator to require a valid token (either scheme) carrying the admin role"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
+        if not is_admin(request.user):
+            return jsonify({'error': 'Admin role required'}), 403
+        return f(*args, **kwargs)
+    
+    return token_required()(decorated)
+
+# Request profiling (off unless PROFILE_SAMPLE_RATE or PROFILE_SLOW_MS is set)
+profiler = RequestProfiler.from_env(exclude=('/admin/profiles',))
+profiler.install(app)
+
+# Startup pre-warm (PREWARM=1): /health answers 503 until the Keycloak caches are filled
+PREWARM = os.getenv('PREWARM', '0') == '1'
+PREWARM_TIMEOUT = float(os.getenv('PREWARM_TIMEOUT', '10'))
+PREWARM_RETRY = 0.5
+
+_discovery = {}
+
+def keycloak_discovery(refresh=False):
+    """The realm's OpenID configuration, fetched once"""
+    if refresh or not _discovery:
+        response = keycloak_request('GET', KEYCLOAK_DISCOVERY_URL, 'discovery', timeout=5)
+        if response.status_code != 200:
+            raise ValueError(f"Discovery request failed with HTTP {response.status_code}")
+        _discovery.update(response.json())
+    return _discovery
+
+class Warmup:
+    """Loads the lazy modules and fills the discovery and JWKS caches in a background thread
+    
+    Each step is retried until PREWARM_TIMEOUT; after that the app reports
+    ready anyway and fills whatever is missing on first use.
+    """
+    
+    def __init__(self, timeout=PREWARM_TIMEOUT):
+        self.timeout = timeout
+        self.ready = threading.Event()
+        self.steps = {}
         
-        if not token:
-            return jsonify({'error': 'Token missing'}), 401
+    def start(self):
+        threading.Thread(target=self.run, name='prewarm', daemon=True).start()
+        return self
         
+    def run(self):
+        deadline = time.monotonic() + self.timeout
         try:
-            if token.startswith('Bearer '):
-                token = token[7:]
+            self.step('imports', self.load_modules, deadline)
+            self.step('discovery', self.load_discovery, deadline)
+            self.step('jwks', token_verifiers.verifiers['keycloak'].refresh_keys, deadline)
+        finally:
+            self.ready.set()
             
-            data = jwt.decode(token, app.secret_key, algorithms=['HS256'])
-            request.user = data
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
+    def step(self, name, func, deadline):
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                func()
+                self.steps[name] = {'ok': True, 'ms': round((time.perf_counter() - start) * 1000, 1), 'attempts': attempts}
+                return
+            except Exception as e:
+                if time.monotonic() + PREWARM_RETRY >= deadline:
+                    print(f"Pre-warm step {name} failed: {e}")
+                    self.steps[name] = {'ok': False, 'error': str(e), 'attempts': attempts}
+                    return
+                time.sleep(PREWARM_RETRY)
+                
+    def load_modules(self):
+        requests.load()
+        jwt.load()
         
-        return f(*args, **kwargs)
+    def load_discovery(self):
+        issuer = keycloak_discovery(refresh=True).get('issuer')
+        if issuer not in KEYCLOAK_ISSUERS:
+            print(f"Warning: Keycloak issuer {issuer} matches neither KEYCLOAK_URL nor KEYCLOAK_INTERNAL_URL; "
+                  f"its tokens will be rejected")
+
+warmup = Warmup()
+if PREWARM:
+    warmup.start()
+else:
+    warmup.ready.set()
+
+# JSON responses
+if orjson is not None:
+    encode_json = orjson.dumps
+else:
+    _json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def encode_json(data):
+        return _json_encoder.encode(data).encode()
+
+@lru_cache(maxsize=4)
+def server_time(second):
+    """server_time string for a unix second; formatted once per second"""
+    return time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(second))
+
+class JSONTemplate:
+    """A JSON object whose constant fields are encoded once; render() only encodes the rest"""
+    
+    def __init__(self, **static):
+        # b'{"message":...,"endpoint":...' - the closing brace comes from the per-call part
+        self.prefix = encode_json(static)[:-1]
+        self.separator = b',' if static else b''
+        
+    def render(self, **fields):
+        if not fields:
+            return self.prefix + b'}'
+        return self.prefix + self.separator + encode_json(fields)[1:]
+
+class PerSecondBody:
+    """Caches the encoded body of a payload that only changes when the second does"""
     
-    return decorated
+    def __init__(self, render):
+        self.render = render
+        self._cached = (None, None)
+        
+    def __call__(self):
+        now = int(time.time())
+        second, body = self._cached
+        if second != now:
+            body = self.render(now)
+            # One tuple assignment, so readers never see a body from another second
+            self._cached = (now, body)
+        return body
+
+def json_response(body, status=200):
+    return app.response_class(body, status=status, mimetype='application/json')
+
+PUBLIC_PAYLOAD = JSONTemplate(
+    message='This is a public endpoint - no authentication required!',
+    authenticated=False,
+    endpoint='/api/public'
+)
+PROTECTED_PAYLOAD = JSONTemplate(
+    message='Successfully accessed protected endpoint with Keycloak token!',
+    authenticated=True,
+    endpoint='/api/protected',
+    auth_method='keycloak'
+)
+PROTECTED_SIMPLE_PAYLOAD = JSONTemplate(
+    message='Successfully accessed protected endpoint with simple JWT!',
+    authenticated=True,
+    endpoint='/api/protected-simple',
+    auth_method='simple_jwt'
+)
+HEALTH_PAYLOAD = JSONTemplate(
+    status='healthy',
+    keycloak_url=KEYCLOAK_URL,
+    realm=REALM_NAME
+)
+STARTING_PAYLOAD = JSONTemplate(status='starting')
+public_body = PerSecondBody(lambda now: PUBLIC_PAYLOAD.render(timestamp=now, server_time=server_time(now)))
+health_body = PerSecondBody(lambda now: HEALTH_PAYLOAD.render(timestamp=now))
+
+def user_response(template, user):
+    now = int(time.time())
+    return json_response(template.render(user=user, timestamp=now, server_time=server_time(now)))
+
+# Page rendering
+PAGE_TEMPLATES = ('index.html', 'simple_login.html', 'dashboard.html')
+MAX_DASHBOARD_FRAGMENTS = 1024
+USER_INFO_MARKER = '<!-- user-info -->'
+
+_templates = {}
+_pages = {}
+_fragments = OrderedDict()
+_render_lock = threading.Lock()
+
+def get_page_template(name):
+    """Return the compiled template; with auto-reload on, a changed file is recompiled and its renders dropped"""
+    template = _templates.get(name)
+    if template is None or (app.jinja_env.auto_reload and not template.is_up_to_date):
+        template = app.jinja_env.get_template(name)
+        with _render_lock:
+            _templates[name] = template
+            for key in [key for key in _pages if key[0] == name]:
+                del _pages[key]
+            if name == 'dashboard.html':
+                _fragments.clear()
+    return template
+
+def page_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def page_response(body, etag, conditional=True):
+    """HTML response with an ETag; a matching If-None-Match gets a 304 without the body"""
+    response = app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request) if conditional else response
+
+def cached_page(name, **context):
+    """Render a page that is the same for every visitor once, and reuse its bytes"""
+    template = get_page_template(name)
+    key = (name,) + tuple(sorted(context.items()))
+    with tracer.span('cache.page', template=name) as span:
+        page = _pages.get(key)
+        span.set_attribute('cache.hit', page is not None)
+    if page is None:
+        with tracer.span('template.render', template=name):
+            body = render_template(template, **context).encode()
+        page = _pages[key] = (body, page_etag(body))
+    return page
+
+def dashboard_page(user):
+    """Dashboard bytes: a shell rendered once around a user_info fragment cached per user"""
+    template = get_page_template('dashboard.html')
+    shell = _pages.get(('dashboard.html', 'shell'))
+    if shell is None:
+        wrapper = app.jinja_env.from_string(
+            '{% extends "dashboard.html" %}{% block user_info %}' + USER_INFO_MARKER + '{% endblock %}')
+        with tracer.span('template.render', template='dashboard.html', block='shell'):
+            prefix, suffix = render_template(wrapper).encode().split(USER_INFO_MARKER.encode())
+        shell = _pages[('dashboard.html', 'shell')] = (prefix, suffix)
+    prefix, suffix = shell
+
+    key = (user.get('username'), user.get('method'))
+    with tracer.span('cache.dashboard_fragment') as span, _render_lock:
+        cached = _fragments.get(key)
+        if cached is not None:
+            _fragments.move_to_end(key)
+        span.set_attribute('cache.hit', cached is not None)
+    if cached is None:
+        with tracer.span('template.render', template='dashboard.html', block='user_info'):
+            fragment = ''.join(template.blocks['user_info'](template.new_context({'user': user}))).encode()
+        body = prefix + fragment + suffix
+        cached = (fragment, page_etag(body))
+        with _render_lock:
+            _fragments[key] = cached
+            while len(_fragments) > MAX_DASHBOARD_FRAGMENTS:
+                _fragments.popitem(last=False)
+    fragment, etag = cached
+    return prefix + fragment + suffix, etag
+
+# Compile the page templates at startup rather than on the first request
+for _name in PAGE_TEMPLATES:
+    get_page_template(_name)
 
 # Routes
 @app.route('/')
 def home():
     user = session.get('user')
-    return render_template('index.html', user=user)
+    if user:
+        with tracer.span('template.render', template='index.html'):
+            return render_template(get_page_template('index.html'), user=user)
+    return page_response(*cached_page('index.html', user=None))
 
 @app.route('/keycloak-login')
 def keycloak_login():
@@ -140,13 +575,13 @@ def keycloak_callback():
     }
     
     try:
-        response = requests.post(KEYCLOAK_TOKEN_URL, data=token_data)
+        response = keycloak_request('POST', KEYCLOAK_TOKEN_URL, 'token', data=token_data)
         if response.status_code == 200:
             tokens = response.json()
             
             # Get user info
             headers = {'Authorization': f"Bearer {tokens['access_token']}"}
-            user_response = requests.get(KEYCLOAK_USERINFO_URL, headers=headers)
+            user_response = keycloak_request('GET', KEYCLOAK_USERINFO_URL, 'userinfo', headers=headers)
             
             if user_response.status_code == 200:
                 user_info = user_response.json()
@@ -167,41 +602,75 @@ def keycloak_callback():
 @app.route('/api/public', methods=['GET'])
 def api_public():
     """Public API endpoint"""
-    return jsonify({
-        'message': 'This is a public endpoint - no authentication required!',
-        'timestamp': int(time.time()),
-        'server_time': time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
-        'authenticated': False,
-        'endpoint': '/api/public'
-    })
+    return json_response(public_body())
 
 @app.route('/api/protected', methods=['GET'])
 @keycloak_token_required
 def api_protected():
     """Protected API endpoint (Keycloak tokens)"""
-    return jsonify({
-        'message': 'Successfully accessed protected endpoint with Keycloak token!',
-        'user': request.user,
-        'authenticated': True,
-        'timestamp': int(time.time()),
-        'server_time': time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
-        'endpoint': '/api/protected',
-        'auth_method': 'keycloak'
-    })
+    return user_response(PROTECTED_PAYLOAD, request.user)
 
 @app.route('/api/protected-simple', methods=['GET'])
 @simple_token_required
 def api_protected_simple():
     """Protected API endpoint (Simple JWT tokens)"""
-    return jsonify({
-        'message': 'Successfully accessed protected endpoint with simple JWT!',
-        'user': request.user,
-        'authenticated': True,
-        'timestamp': int(time.time()),
-        'server_time': time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
-        'endpoint': '/api/protected-simple',
-        'auth_method': 'simple_jwt'
-    })
+    return user_response(PROTECTED_SIMPLE_PAYLOAD, request.user)
+
+@app.route('/api/token-metrics', methods=['GET'])
+@token_required()
+def api_token_metrics():
+    """Verification counts per token scheme (any valid token)"""
+    return jsonify(token_verifiers.snapshot())
+
+@app.route('/admin/profiles', methods=['GET'])
+@admin_required
+def admin_profiles():
+    """Profiler settings and the stored profiles, newest first"""
+    return jsonify({'settings': profiler.settings(), 'profiles': profiler.summaries()})
+
+@app.route('/admin/profiles/settings', methods=['POST'])
+@admin_required
+def admin_profile_settings():
+    """Change sample_rate, slow_ms or capacity at runtime"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        profiler.configure(
+            sample_rate=float(data['sample_rate']) if data.get('sample_rate') is not None else None,
+            slow_ms=float(data['slow_ms']) if data.get('slow_ms') is not None else None,
+            capacity=int(data['capacity']) if data.get('capacity') is not None else None
+        )
+    except (TypeError, ValueError, OverflowError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(profiler.settings())
+
+@app.route('/admin/profiles/collapsed', methods=['GET'])
+@app.route('/admin/profiles/<int:profile_id>/collapsed', methods=['GET'])
+@admin_required
+def admin_profiles_collapsed(profile_id=None):
+    """Collapsed stacks of one profile, or of all stored profiles merged, as a download"""
+    if profile_id is None:
+        text, filename = profiler.collapsed(), 'profiles.collapsed'
+    else:
+        profile = profiler.get(profile_id)
+        if profile is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        text, filename = profiler.collapsed([profile]), f"profile-{profile_id}.collapsed"
+    response = app.response_class(text, mimetype='text/plain')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@app.route('/admin/profiles/<int:profile_id>', methods=['GET'])
+@admin_required
+def admin_profile(profile_id):
+    """One profile with its stacks, most sampled first"""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    summary = {key: value for key, value in profile.items() if key != 'stacks'}
+    summary['stacks'] = profiler.stack_counts(profile)
+    return jsonify(summary)
 
 @app.route('/api/keycloak-login', methods=['POST'])
 def api_keycloak_login():
@@ -222,13 +691,13 @@ def api_keycloak_login():
     }
     
     try:
-        response = requests.post(KEYCLOAK_TOKEN_URL, data=token_data)
+        response = keycloak_request('POST', KEYCLOAK_TOKEN_URL, 'token', data=token_data)
         if response.status_code == 200:
             tokens = response.json()
             
             # Get user info
             headers = {'Authorization': f"Bearer {tokens['access_token']}"}
-            user_response = requests.get(KEYCLOAK_USERINFO_URL, headers=headers)
+            user_response = keycloak_request('GET', KEYCLOAK_USERINFO_URL, 'userinfo', headers=headers)
             
             if user_response.status_code == 200:
                 user_info = user_response.json()
@@ -291,16 +760,16 @@ def simple_login():
             session['user'] = {'username': 'admin', 'method': 'simple'}
             return redirect('/dashboard')
         else:
-            return render_template('simple_login.html', error=True)
+            return page_response(*cached_page('simple_login.html', error=True), conditional=False)
     
-    return render_template('simple_login.html')
+    return page_response(*cached_page('simple_login.html'))
 
 @app.route('/dashboard')
 def dashboard():
     user = session.get('user')
     if not user:
         return redirect('/')
-    return render_template('dashboard.html', user=user)
+    return page_response(*dashboard_page(user))
 
 @app.route('/logout')
 def logout():
@@ -309,17 +778,15 @@ def logout():
 
 @app.route('/health')
 def health():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': int(time.time()),
-        'keycloak_url': KEYCLOAK_URL,
-        'realm': REALM_NAME
-    })
+    """Health check endpoint; 503 while the startup pre-warm is running"""
+    if not warmup.ready.is_set():
+        return json_response(STARTING_PAYLOAD.render(prewarm=dict(warmup.steps)), status=503)
+    return json_response(health_body())
 
 if __name__ == '__main__':
     print("🚀 Starting Keycloak-Integrated IAM System")
     print(f"🔐 Keycloak URL: {KEYCLOAK_URL}")
     print(f"🏛️ Realm: {REALM_NAME}")
     print("🌐 Flask App: http://localhost:5000")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # The debug reloader imports everything twice; containers set FLASK_DEBUG=0
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '1') != '0')
\ No newline at end of file
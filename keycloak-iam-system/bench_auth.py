@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Auth Path Microbenchmarks for the Keycloak IAM System
+Runs the token decorators, validate_keycloak_token and the JSON response
+builders in-process through Flask's test client, with Keycloak replaced by
+the mock_keycloak stand-in, and reports ops/sec and allocations per call.
+With --http the JSON endpoints are also served over a real socket and
+driven by the load generator to report requests/sec
+"""
+
+import argparse
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest import mock
+from urllib.parse import urlsplit
+
+import jwt
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as iam_app
+import mock_keycloak
+from bench_results import write_json, RESULTS_VERSION
+from loadgen import LoadGenerator
+
+MIN_TIME = 1.0
+MAX_ITERATIONS = 200_000
+COLD_TOKENS = 2000
+ALLOC_SAMPLE = 200
+HTTP_ENDPOINTS = ("public", "health")
+HTTP_CONCURRENCY = 8
+HTTP_DURATION = 5.0
+
+
+class UpstreamResponse:
+    """Minimal stand-in for requests.Response built from a Flask test response"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.ok = response.status_code < 400
+        self.text = response.get_data(as_text=True)
+        self._json = response.get_json(silent=True)
+
+    def json(self):
+        if self._json is None:
+            raise ValueError("Response is not JSON")
+        return self._json
+
+
+class UpstreamStub:
+    """Routes the app's requests.get/post calls into the mock Keycloak app in-process"""
+
+    exceptions = iam_app.requests.exceptions
+
+    def __init__(self, upstream_app):
+        self.client = upstream_app.test_client()
+        self.calls = 0
+
+    def request(self, method, url, headers=None, data=None, **kwargs):
+        self.calls += 1
+        parts = urlsplit(url)
+        response = self.client.open(parts.path, method=method, base_url=f"{parts.scheme}://{parts.netloc}",
+                                    query_string=parts.query, headers=headers or {}, data=data)
+        return UpstreamResponse(response)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+class AuthBenchmark:
+    """Builds the tokens and request cases, then times each case"""
+
+    def __init__(self, min_time=MIN_TIME, cold_tokens=COLD_TOKENS):
+        self.min_time = min_time
+        self.cold_tokens = cold_tokens
+        self.upstream_app = mock_keycloak.create_app()
+        self.realm = self.upstream_app.config['MOCK_REALM']
+        self.upstream = UpstreamStub(self.upstream_app)
+        self.client = iam_app.app.test_client()
+        self.issuer = f"{iam_app.KEYCLOAK_INTERNAL_URL}/realms/{iam_app.REALM_NAME}"
+        self.results = []
+
+    def keycloak_token(self, username="admin", lifespan=300):
+        user = self.realm.users[username]
+        claims = self.realm.user_claims(user)
+        token = self.realm.issue_tokens(self.issuer, iam_app.CLIENT_ID, claims, "openid email profile")
+        if lifespan == 300:
+            return token['access_token']
+        payload = jwt.decode(token['access_token'], options={'verify_signature': False})
+        payload['exp'] = int(time.time()) + lifespan
+        return self.realm.sign(payload)
+
+    def simple_token(self, lifespan=3600, subject="admin"):
+        now = int(time.time())
+        payload = {'username': subject, 'role': 'admin', 'iat': now, 'exp': now + lifespan}
+        return jwt.encode(payload, iam_app.app.secret_key, algorithm='HS256')
+
+    def build_cases(self):
+        """Return (name, expected_status, callable) for every benchmark case"""
+        get = self.client.get
+
+        def header(token):
+            return {'Authorization': f'Bearer {token}'}
+
+        keycloak_valid = header(self.keycloak_token())
+        keycloak_expired = header(self.keycloak_token(lifespan=-60))
+        simple_valid = header(self.simple_token())
+        simple_expired = header(self.simple_token(lifespan=-60))
+        malformed = header("invalid.jwt.token")
+
+        # Cold cases use a distinct token per call so nothing keyed by token can be reused
+        keycloak_cold = [header(self.keycloak_token()) for _ in range(min(self.cold_tokens, 500))]
+        simple_cold = [header(self.simple_token(subject=f"user{i}")) for i in range(self.cold_tokens)]
+
+        def rotating(headers_list, path):
+            state = {'i': 0}
+
+            def call():
+                headers = headers_list[state['i'] % len(headers_list)]
+                state['i'] += 1
+                return get(path, headers=headers)
+            return call
+
+        def build_public():
+            with iam_app.app.test_request_context('/api/public'):
+                return iam_app.api_public()
+
+        # Pages: anonymous renders come from the page cache; the dashboard needs its own session
+        etag = self.client.get('/').headers['ETag']
+        dashboard_client = iam_app.app.test_client()
+        with dashboard_client.session_transaction() as flask_session:
+            flask_session['user'] = {'username': 'admin', 'method': 'simple'}
+
+        def build_protected():
+            with iam_app.app.test_request_context('/api/protected'):
+                iam_app.request.user = {'preferred_username': 'admin', 'email': 'admin@example.com'}
+                return iam_app.api_protected.__wrapped__()
+
+        return [
+            ("GET /api/public", 200, lambda: get('/api/public')),
+            ("GET /health", 200, lambda: get('/health')),
+            ("GET / anonymous", 200, lambda: get('/')),
+            ("GET / revalidate", 304, lambda: get('/', headers={'If-None-Match': etag})),
+            ("GET /simple-login", 200, lambda: get('/simple-login')),
+            ("GET /dashboard", 200, lambda: dashboard_client.get('/dashboard')),
+            ("builder api_public", 200, build_public),
+            ("builder api_protected", 200, build_protected),
+            ("simple valid warm", 200, lambda: get('/api/protected-simple', headers=simple_valid)),
+            ("simple valid cold", 200, rotating(simple_cold, '/api/protected-simple')),
+            ("simple expired", 401, lambda: get('/api/protected-simple', headers=simple_expired)),
+            ("simple malformed", 401, lambda: get('/api/protected-simple', headers=malformed)),
+            ("simple missing", 401, lambda: get('/api/protected-simple')),
+            ("keycloak valid warm", 200, lambda: get('/api/protected', headers=keycloak_valid)),
+            ("keycloak valid cold", 200, rotating(keycloak_cold, '/api/protected')),
+            ("keycloak expired", 401, lambda: get('/api/protected', headers=keycloak_expired)),
+            ("keycloak malformed", 401, lambda: get('/api/protected', headers=malformed)),
+            ("keycloak missing", 401, lambda: get('/api/protected')),
+            ("validate_keycloak_token", None,
+             lambda: iam_app.validate_keycloak_token(keycloak_valid['Authorization'])),
+        ]
+
+    def run_case(self, name, expected_status, func):
+        """Time one case and measure its allocations"""
+        result = func()
+        status = getattr(result, 'status_code', None)
+        if expected_status is not None and status != expected_status:
+            raise RuntimeError(f"{name}: expected HTTP {expected_status}, got {status}")
+
+        # Timing loop: run until min_time has passed, doubling the batch size
+        iterations = 0
+        calls_before = self.upstream.calls
+        gc.collect()
+        start = time.perf_counter()
+        batch = 1
+        while True:
+            for _ in range(batch):
+                func()
+            iterations += batch
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.min_time or iterations >= MAX_ITERATIONS:
+                break
+            batch = min(batch * 2, MAX_ITERATIONS - iterations)
+        upstream_calls = self.upstream.calls - calls_before
+
+        # Allocation pass: traced separately so tracing overhead doesn't skew the timings
+        sample = min(ALLOC_SAMPLE, iterations)
+        gc.collect()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base_current, _ = tracemalloc.get_traced_memory()
+        peak_total = 0
+        for _ in range(sample):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - before
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.results.append({
+            'name': name,
+            'iterations': iterations,
+            'ops_per_sec': iterations / elapsed,
+            'us_per_op': elapsed / iterations * 1e6,
+            'peak_kib_per_op': peak_total / sample / 1024.0,
+            'retained_bytes_per_op': (current - base_current) / sample,
+            'upstream_calls_per_op': upstream_calls / iterations,
+        })
+
+    def run(self, selected=None):
+        with mock.patch.object(iam_app, 'requests', self.upstream):
+            for name, expected_status, func in self.build_cases():
+                if selected and not any(pattern in name for pattern in selected):
+                    continue
+                self.run_case(name, expected_status, func)
+        return self.results
+
+    def print_results(self):
+        header = f"{'case':<26}{'ops/sec':>11}{'us/op':>10}{'peak KiB/op':>13}{'kept B/op':>11}{'upstream/op':>13}"
+        print(header)
+        print("-" * len(header))
+        for result in self.results:
+            print(f"{result['name']:<26}{result['ops_per_sec']:>11.0f}{result['us_per_op']:>10.1f}"
+                  f"{result['peak_kib_per_op']:>13.1f}{result['retained_bytes_per_op']:>11.0f}"
+                  f"{result['upstream_calls_per_op']:>13.2f}")
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Skips the per-request access log line, which would dominate the timing"""
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+def run_http(endpoints=HTTP_ENDPOINTS, concurrency=HTTP_CONCURRENCY, duration=HTTP_DURATION):
+    """Serve the app on a loopback port and drive each endpoint closed-loop; returns per-endpoint results"""
+    server = make_server('127.0.0.1', 0, iam_app.app, threaded=True, request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='bench-http', daemon=True)
+    thread.start()
+    results = []
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        for name in endpoints:
+            generator = LoadGenerator(base_url, [name], concurrency=concurrency, duration=duration)
+            generator.run()
+            result = generator.summary()[name]
+            result['name'] = name
+            results.append(result)
+    finally:
+        server.shutdown()
+        thread.join()
+    return results
+
+
+def print_http_results(results):
+    header = f"{'endpoint':<12}{'requests':>10}{'req/sec':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['name']:<12}{result['requests']:>10}{result['throughput_rps']:>10.0f}"
+              f"{result['percentiles_ms']['p50']:>9.2f}{result['percentiles_ms']['p99']:>9.2f}{result['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the auth decorators and token paths")
+    parser.add_argument("cases", nargs="*", help="only run cases whose name contains one of these strings")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds to spend per case")
+    parser.add_argument("--http", action="store_true",
+                        help=f"also measure requests/sec over HTTP for {', '.join(HTTP_ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=HTTP_CONCURRENCY, help="HTTP clients (with --http)")
+    parser.add_argument("--duration", type=float, default=HTTP_DURATION, help="seconds per endpoint (with --http)")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+
+    bench = AuthBenchmark(min_time=args.min_time)
+    bench.run(args.cases)
+    bench.print_results()
+
+    http_results = []
+    if args.http:
+        print()
+        http_results = run_http(concurrency=args.concurrency, duration=args.duration)
+        print_http_results(http_results)
+
+    if args.json:
+        write_json({
+            'version': RESULTS_VERSION,
+            'mode': 'microbenchmark',
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'results': bench.results,
+            'http_results': http_results,
+        }, args.json)
+
+
+if __name__ == '__main__':
+    main()
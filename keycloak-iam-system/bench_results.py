@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark Result Files for the Keycloak IAM System
+Writes test and load runs as JSON and JUnit XML, and compares a run
+against a stored baseline to catch latency and throughput regressions
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ET
+
+RESULTS_VERSION = 1
+DEFAULT_THRESHOLD = 0.10
+
+
+def write_json(results, path):
+    """Write a results document as JSON"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_json(path):
+    """Load a results document, checking it is one this module understands"""
+    with open(path) as f:
+        results = json.load(f)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path}: unsupported results version {results.get('version')!r}")
+    return results
+
+
+def write_junit(results, path, regressions=()):
+    """Write a results document (plus any baseline regressions) as JUnit XML"""
+    suite = ET.Element("testsuite", name=f"test_apis.{results['mode']}",
+                       timestamp=results["started_at"], time=f"{results['duration_s']:.3f}")
+    failures = 0
+
+    for test in results.get("tests", []):
+        duration_ms = test.get("duration_ms") or 0.0
+        case = ET.SubElement(suite, "testcase", classname="test_apis", name=test["test"],
+                             time=f"{duration_ms / 1000.0:.3f}")
+        if not test["passed"]:
+            failures += 1
+            ET.SubElement(case, "failure", message=test.get("details") or "failed")
+
+    if results["mode"] == "load":
+        for name, endpoint in results["endpoints"].items():
+            case = ET.SubElement(suite, "testcase", classname="test_apis.load", name=name,
+                                 time=f"{results['duration_s']:.3f}")
+            props = ET.SubElement(case, "properties")
+            for key in ("requests", "errors", "throughput_rps"):
+                ET.SubElement(props, "property", name=key, value=str(endpoint[key]))
+            for key, value in endpoint["percentiles_ms"].items():
+                ET.SubElement(props, "property", name=f"{key}_ms", value=f"{value:.3f}")
+            if endpoint["errors"]:
+                failures += 1
+                ET.SubElement(case, "failure",
+                              message=f"{endpoint['errors']} of {endpoint['requests']} requests failed")
+
+    for regression in regressions:
+        case = ET.SubElement(suite, "testcase", classname="test_apis.baseline",
+                             name=f"{regression['endpoint']} {regression['metric']}", time="0")
+        failures += 1
+        ET.SubElement(case, "failure", message=describe_regression(regression))
+
+    suite.set("tests", str(len(suite.findall("testcase"))))
+    suite.set("failures", str(failures))
+    suite.set("errors", "0")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def compare_to_baseline(results, baseline, latency_threshold=DEFAULT_THRESHOLD,
+                        throughput_threshold=DEFAULT_THRESHOLD):
+    """Return the endpoints whose p95 latency or throughput regressed beyond the thresholds
+
+    Thresholds are relative: 0.10 fails when p95 grows by more than 10% or
+    throughput drops by more than 10%. Throughput is only compared between
+    load runs, since functional runs issue a fixed handful of requests.
+    """
+    if results["mode"] != baseline["mode"]:
+        raise ValueError(f"Cannot compare a {results['mode']} run against a {baseline['mode']} baseline")
+
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if not previous:
+            continue
+
+        current_p95 = current["percentiles_ms"]["p95"]
+        previous_p95 = previous["percentiles_ms"]["p95"]
+        if previous_p95 > 0 and current_p95 > previous_p95 * (1 + latency_threshold):
+            regressions.append({
+                "endpoint": name,
+                "metric": "p95_ms",
+                "baseline": previous_p95,
+                "current": current_p95,
+                "change": current_p95 / previous_p95 - 1,
+            })
+
+        if results["mode"] == "load":
+            current_rps = current["throughput_rps"]
+            previous_rps = previous["throughput_rps"]
+            if previous_rps > 0 and current_rps < previous_rps * (1 - throughput_threshold):
+                regressions.append({
+                    "endpoint": name,
+                    "metric": "throughput_rps",
+                    "baseline": previous_rps,
+                    "current": current_rps,
+                    "change": current_rps / previous_rps - 1,
+                })
+    return regressions
+
+
+def describe_regression(regression):
+    """One-line human readable description of a regression"""
+    return (f"{regression['endpoint']}: {regression['metric']} {regression['baseline']:.2f} -> "
+            f"{regression['current']:.2f} ({regression['change'] * 100:+.1f}%)")
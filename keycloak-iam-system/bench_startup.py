@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cold Start Report for the Keycloak IAM System
+Breaks down the import time of app.py by module with `python -X importtime`
+and times fresh processes from launch until /health answers 200, checking
+the result against a cold-start budget
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from bench_results import write_json, RESULTS_VERSION
+
+RUNS = 5
+BUDGET_MS = 500.0
+READY_TIMEOUT = 30.0
+POLL_INTERVAL = 0.005
+TOP_MODULES = 15
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Serves app.py the way a replica would, on the port given as argv[1]
+SERVE = ("import sys; from werkzeug.serving import make_server; import app; "
+         "make_server('127.0.0.1', int(sys.argv[1]), app.app, threaded=True).serve_forever()")
+
+
+def parse_importtime(stderr):
+    """Return [(depth, name, self_us, cumulative_us)] from `python -X importtime` output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_breakdown(runs=RUNS, env=None):
+    """Median cumulative import time of app.py and of each module it imports directly"""
+    samples = {}
+    totals = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=HERE, env=env,
+                                capture_output=True, text=True, check=True)
+        entries = parse_importtime(result.stderr)
+        # Entries are written as imports finish, so app comes after everything it pulled in
+        app_index = next(i for i, entry in enumerate(entries) if entry[1] == 'app' and entry[0] == 0)
+        start = app_index
+        while start > 0 and entries[start - 1][0] > 0:
+            start -= 1
+        _, _, app_self, app_total = entries[app_index]
+        totals.append(app_total)
+        samples.setdefault('app (own code)', []).append(app_self)
+        for depth, name, _, cumulative in entries[start:app_index]:
+            if depth == 1:
+                samples.setdefault(name, []).append(cumulative)
+    modules = sorted(((name, statistics.median(values) / 1000.0) for name, values in samples.items()),
+                     key=lambda item: item[1], reverse=True)
+    return statistics.median(totals) / 1000.0, modules
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_to_ready(env=None, timeout=READY_TIMEOUT):
+    """Milliseconds from launching a fresh app process until /health answers 200"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    session = requests.Session()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', SERVE, str(port)], cwd=HERE, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"App exited with code {process.returncode} before it was ready")
+            try:
+                if session.get(url, timeout=1).status_code == 200:
+                    return (time.perf_counter() - start) * 1000.0
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(POLL_INTERVAL)
+        raise RuntimeError(f"App was not ready after {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown and time-to-ready for app.py")
+    parser.add_argument("--runs", type=int, default=RUNS, help="fresh processes per measurement")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS,
+                        help="fail if the median time to ready exceeds this")
+    parser.add_argument("--prewarm", action="store_true", help="start the app with PREWARM=1")
+    parser.add_argument("--top", type=int, default=TOP_MODULES, help="modules to list")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop('PREWARM', None)
+    # The pre-warm thread's imports would interleave with the breakdown, so it only applies to time to ready
+    import_ms, modules = import_breakdown(args.runs, env)
+    if args.prewarm:
+        env['PREWARM'] = '1'
+    print(f"{'module':<30}{'import ms':>10}")
+    print("-" * 40)
+    for name, ms in modules[:args.top]:
+        print(f"{name:<30}{ms:>10.1f}")
+    print("-" * 40)
+    print(f"{'import app (total)':<30}{import_ms:>10.1f}")
+
+    ready = sorted(time_to_ready(env) for _ in range(args.runs))
+    ready_ms = statistics.median(ready)
+    print()
+    print(f"Time to ready{' (pre-warmed)' if args.prewarm else ''}: median {ready_ms:.0f} ms, "
+          f"min {ready[0]:.0f} ms, max {ready[-1]:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+
+    if args.json:
+        write_json({
+            'version': RESULTS_VERSION,
+            'mode': 'startup',
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'prewarm': args.prewarm,
+            'import_ms': import_ms,
+            'modules_ms': dict(modules),
+            'ready_ms': ready,
+            'budget_ms': args.budget_ms,
+        }, args.json)
+    if ready_ms > args.budget_ms:
+        sys.exit(f"Cold start over budget: {ready_ms:.0f} ms > {args.budget_ms:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Load Generator for the Keycloak IAM System
+Drives the API endpoints at a fixed request rate (open loop) or a fixed
+number of concurrent clients (closed loop) and reports latency percentiles
+"""
+
+import math
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Endpoints the load generator knows how to call: name -> (method, path, auth)
+LOAD_ENDPOINTS = {
+    "public": ("GET", "/api/public", None),
+    "protected": ("GET", "/api/protected", "keycloak"),
+    "protected-simple": ("GET", "/api/protected-simple", "simple"),
+    "keycloak-login": ("POST", "/api/keycloak-login", "credentials"),
+    "health": ("GET", "/health", None),
+}
+# The mix a load test drives unless told otherwise
+DEFAULT_LOAD_ENDPOINTS = ("public", "protected", "protected-simple", "keycloak-login")
+PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies recorded in microseconds
+
+    Values below 2**sub_bucket_bits are counted exactly; above that every
+    power of two is split into 2**(sub_bucket_bits - 1) linear sub-buckets,
+    so the relative error of any reported value stays below 2 / 2**sub_bucket_bits.
+    """
+
+    def __init__(self, sub_bucket_bits=7, max_value_us=60_000_000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.max_value_us = max_value_us
+        self.counts = [0] * (self._index(max_value_us) + 1)
+        self.total_count = 0
+        self.min_us = None
+        self.max_us = 0
+        self.sum_us = 0
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.half_count + ((value >> shift) - self.half_count)
+
+    def _highest_equivalent(self, index):
+        if index < self.sub_bucket_count:
+            return index
+        shift, offset = divmod(index - self.sub_bucket_count, self.half_count)
+        shift += 1
+        return ((offset + self.half_count + 1) << shift) - 1
+
+    def record(self, value_us):
+        """Record one latency in microseconds, clamped to the histogram range"""
+        value = min(max(int(value_us), 0), self.max_value_us)
+        self.counts[self._index(value)] += 1
+        self.total_count += 1
+        self.sum_us += value
+        if self.min_us is None or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same layout"""
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total_count += other.total_count
+        self.sum_us += other.sum_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, pct):
+        """Return the value (in microseconds) at or below which pct percent of samples fall"""
+        if not self.total_count:
+            return 0
+        target = max(1, math.ceil(self.total_count * pct / 100.0))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max_us)
+        return self.max_us
+
+    def mean(self):
+        return self.sum_us / self.total_count if self.total_count else 0.0
+
+
+class EndpointStats:
+    """Latency histogram and outcome counters for one endpoint"""
+
+    def __init__(self, name):
+        self.name = name
+        self.histogram = LatencyHistogram()
+        self.ok = 0
+        self.errors = 0
+        self.status_counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, latency_us, status):
+        with self.lock:
+            self.histogram.record(latency_us)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status == 200:
+                self.ok += 1
+            else:
+                self.errors += 1
+
+    @property
+    def requests(self):
+        return self.ok + self.errors
+
+
+class LoadGenerator:
+    """Drive a mix of endpoints in open-loop (rate) or closed-loop (concurrency) mode"""
+
+    def __init__(self, base_url, endpoints, concurrency=8, rate=None, duration=10.0,
+                 keycloak_token=None, simple_token=None, credentials=None, timeout=10,
+                 record_samples=False):
+        unknown = [name for name in endpoints if name not in LOAD_ENDPOINTS]
+        if unknown:
+            raise ValueError(f"Unknown load endpoints: {', '.join(unknown)}")
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        if rate is not None and rate <= 0:
+            raise ValueError("Rate must be positive")
+
+        self.base_url = base_url
+        self.endpoints = list(endpoints)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.keycloak_token = keycloak_token
+        self.simple_token = simple_token
+        self.credentials = credentials
+        self.timeout = timeout
+        self.stats = {name: EndpointStats(name) for name in self.endpoints}
+        self.elapsed = 0.0
+        self.backlog_max = 0
+        self.record_samples = record_samples
+        self.samples = []
+        self.started = None
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _send(self, session, name):
+        """Issue one request and return its HTTP status (0 on transport error)"""
+        method, path, auth = LOAD_ENDPOINTS[name]
+        kwargs = {"timeout": self.timeout}
+        if auth == "keycloak":
+            kwargs["headers"] = {"Authorization": f"Bearer {self.keycloak_token}"}
+        elif auth == "simple":
+            kwargs["headers"] = {"Authorization": f"Bearer {self.simple_token}"}
+        elif auth == "credentials":
+            kwargs["json"] = self.credentials
+        try:
+            response = session.request(method, f"{self.base_url}{path}", **kwargs)
+            return response.status_code
+        except requests.exceptions.RequestException:
+            return 0
+
+    def _open_loop_worker(self, jobs):
+        session = self._new_session()
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            intended_start, name = job
+            status = self._send(session, name)
+            # Measure from the scheduled send time, not the actual one, so that
+            # time spent queued behind slow requests is charged to the latency
+            self._record(name, intended_start, time.perf_counter() - intended_start, status)
+
+    def _closed_loop_worker(self, offset, deadline):
+        session = self._new_session()
+        i = offset
+        while time.perf_counter() < deadline:
+            name = self.endpoints[i % len(self.endpoints)]
+            i += 1
+            start = time.perf_counter()
+            status = self._send(session, name)
+            self._record(name, start, time.perf_counter() - start, status)
+
+    def _record(self, name, start, latency, status):
+        self.stats[name].record(latency * 1e6, status)
+        if self.record_samples:
+            # list.append is atomic, so workers can share the sample list
+            self.samples.append((name, round((start - self.started) * 1000.0, 3),
+                                 round(latency * 1000.0, 3), status))
+
+    def run(self):
+        """Run the load for the configured duration and return the per-endpoint stats"""
+        start = self.started = time.perf_counter()
+        deadline = start + self.duration
+
+        if self.rate:
+            jobs = queue.Queue()
+            workers = [threading.Thread(target=self._open_loop_worker, args=(jobs,), daemon=True)
+                       for _ in range(self.concurrency)]
+            for worker in workers:
+                worker.start()
+
+            interval = 1.0 / self.rate
+            i = 0
+            while True:
+                intended_start = start + i * interval
+                if intended_start >= deadline:
+                    break
+                delay = intended_start - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                jobs.put((intended_start, self.endpoints[i % len(self.endpoints)]))
+                self.backlog_max = max(self.backlog_max, jobs.qsize())
+                i += 1
+
+            for _ in workers:
+                jobs.put(None)
+        else:
+            workers = [threading.Thread(target=self._closed_loop_worker, args=(n, deadline), daemon=True)
+                       for n in range(self.concurrency)]
+            for worker in workers:
+                worker.start()
+
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - start
+        return self.stats
+
+    def summary(self):
+        """Return plain-dict results per endpoint (latencies in milliseconds)"""
+        return summarize_stats(self.stats, self.elapsed)
+
+
+def summarize_stats(stats_by_name, elapsed):
+    """Turn EndpointStats into plain-dict results (latencies in milliseconds)"""
+    results = {}
+    for name, stats in stats_by_name.items():
+        hist = stats.histogram
+        results[name] = {
+            "requests": stats.requests,
+            "ok": stats.ok,
+            "errors": stats.errors,
+            "error_rate": stats.errors / stats.requests if stats.requests else 0.0,
+            "throughput_rps": stats.requests / elapsed if elapsed else 0.0,
+            "mean_ms": hist.mean() / 1000.0,
+            "max_ms": hist.max_us / 1000.0,
+            "percentiles_ms": {f"p{pct:g}": hist.percentile(pct) / 1000.0 for pct in PERCENTILES},
+            "status_counts": {str(code): count for code, count in sorted(stats.status_counts.items())},
+        }
+    return results
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Offline OIDC Stand-in for Keycloak
+Serves the flask-demo realm from keycloak/realm-export.json (discovery, JWKS,
+token grants and userinfo) with RS256-signed tokens, so the Flask app can be
+tested and benchmarked without a Keycloak container or network access
+"""
+
+import argparse
+import html
+import json
+import os
+import random
+import secrets
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, request, jsonify, redirect
+
+# Configuration
+REALM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keycloak', 'realm-export.json')
+DEFAULT_PORT = 8080
+KEY_ID = 'mock-keycloak-rs256'
+REFRESH_TOKEN_LIFESPAN = 1800
+
+LOGIN_FORM = """<!DOCTYPE html>
+<html><head><title>Sign in to {realm}</title></head>
+<body>
+<h1>Sign in to {realm}</h1>
+<form method="post">
+{hidden}
+<input name="username" placeholder="Username" autofocus>
+<input name="password" type="password" placeholder="Password">
+<button type="submit">Sign In</button>
+</form>
+</body></html>
+"""
+
+
+class FaultInjector:
+    """Adds configurable latency and random 503s to realm endpoints"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def apply(self):
+        """Sleep for the injected latency; returns True when this request should fail"""
+        with self.lock:
+            delay_ms = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+            fail = self.error_rate > 0 and self.random.random() < self.error_rate
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        return fail
+
+
+class MockRealm:
+    """Users, clients and signing key for one realm export"""
+
+    def __init__(self, realm_file=REALM_FILE, token_lifespan=None):
+        with open(realm_file) as f:
+            export = json.load(f)
+
+        self.name = export['realm']
+        self.token_lifespan = token_lifespan or export.get('accessTokenLifespan', 300)
+        self.code_lifespan = export.get('accessCodeLifespan', 60)
+        self.users = {user['username']: user for user in export.get('users', []) if user.get('enabled', True)}
+        self.clients = {client['clientId']: client for client in export.get('clients', []) if client.get('enabled', True)}
+
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({'kid': KEY_ID, 'use': 'sig', 'alg': 'RS256'})
+        self.jwks = {'keys': [jwk]}
+
+        self.codes = {}
+        self.codes_lock = threading.Lock()
+
+    def check_password(self, username, password):
+        user = self.users.get(username)
+        if not user:
+            return None
+        for credential in user.get('credentials', []):
+            if credential.get('type') == 'password' and secrets.compare_digest(
+                    str(credential.get('value', '')), str(password or '')):
+                return user
+        return None
+
+    def check_client(self, client_id, client_secret):
+        client = self.clients.get(client_id)
+        if not client:
+            return None
+        if client.get('publicClient'):
+            return client
+        if client_secret and secrets.compare_digest(str(client.get('secret', '')), str(client_secret)):
+            return client
+        return None
+
+    def user_claims(self, user):
+        """Profile claims Keycloak puts in tokens and userinfo for a user"""
+        first, last = user.get('firstName', ''), user.get('lastName', '')
+        return {
+            'sub': str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.name}/{user['username']}")),
+            'preferred_username': user['username'],
+            'email': user.get('email'),
+            'email_verified': user.get('emailVerified', False),
+            'given_name': first,
+            'family_name': last,
+            'name': f"{first} {last}".strip(),
+            'realm_access': {'roles': list(user.get('realmRoles', []))},
+            'resource_access': {
+                client: {'roles': list(roles)} for client, roles in user.get('clientRoles', {}).items()
+            },
+        }
+
+    def service_account_claims(self, client_id):
+        username = f"service-account-{client_id}"
+        return {
+            'sub': str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.name}/{username}")),
+            'preferred_username': username,
+            'email_verified': False,
+            'clientId': client_id,
+            'realm_access': {'roles': []},
+            'resource_access': {},
+        }
+
+    def issue_tokens(self, issuer, client_id, claims, scope, nonce=None, session_state=None):
+        """Build a Keycloak-shaped token response for the given subject claims"""
+        now = int(time.time())
+        session_state = session_state or str(uuid.uuid4())
+        common = {
+            'iat': now,
+            'iss': issuer,
+            'sub': claims['sub'],
+            'azp': client_id,
+            'session_state': session_state,
+            'sid': session_state,
+        }
+
+        access = dict(common, **claims)
+        access.update({
+            'exp': now + self.token_lifespan,
+            'jti': str(uuid.uuid4()),
+            'aud': 'account',
+            'typ': 'Bearer',
+            'scope': scope,
+        })
+        refresh = dict(common, exp=now + REFRESH_TOKEN_LIFESPAN, jti=str(uuid.uuid4()),
+                       aud=issuer, typ='Refresh', scope=scope)
+
+        response = {
+            'access_token': self.sign(access),
+            'expires_in': self.token_lifespan,
+            'refresh_expires_in': REFRESH_TOKEN_LIFESPAN,
+            'refresh_token': self.sign(refresh),
+            'token_type': 'Bearer',
+            'not-before-policy': 0,
+            'session_state': session_state,
+            'scope': scope,
+        }
+        if 'openid' in scope.split():
+            id_token = dict(common, **claims)
+            id_token.update({'exp': now + self.token_lifespan, 'jti': str(uuid.uuid4()),
+                             'aud': client_id, 'typ': 'ID'})
+            if nonce:
+                id_token['nonce'] = nonce
+            response['id_token'] = self.sign(id_token)
+        return response
+
+    def sign(self, payload):
+        return jwt.encode(payload, self.private_key, algorithm='RS256', headers={'kid': KEY_ID})
+
+    def verify(self, token, issuer, typ):
+        """Decode a token this realm issued; returns None when invalid or expired"""
+        try:
+            claims = jwt.decode(token, self.private_key.public_key(), algorithms=['RS256'],
+                                issuer=issuer, options={'verify_aud': False})
+        except jwt.InvalidTokenError:
+            return None
+        return claims if claims.get('typ') == typ else None
+
+    def new_code(self, username, client_id, redirect_uri, scope, nonce):
+        code = secrets.token_urlsafe(24)
+        with self.codes_lock:
+            self.codes[code] = (username, client_id, redirect_uri, scope, nonce, time.time() + self.code_lifespan)
+        return code
+
+    def redeem_code(self, code):
+        with self.codes_lock:
+            entry = self.codes.pop(code, None)
+            expired = [key for key, value in self.codes.items() if value[5] < time.time()]
+            for key in expired:
+                del self.codes[key]
+        if not entry or entry[5] < time.time():
+            return None
+        return entry
+
+
+def oauth_error(error, description, status=400):
+    return jsonify({'error': error, 'error_description': description}), status
+
+
+def create_app(realm_file=REALM_FILE, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None,
+               token_lifespan=None):
+    """Build the stand-in Flask app for one realm export"""
+    app = Flask(__name__)
+    realm = MockRealm(realm_file, token_lifespan=token_lifespan)
+    faults = FaultInjector(latency_ms, jitter_ms, error_rate, seed)
+    app.config['MOCK_REALM'] = realm
+    app.config['FAULT_INJECTOR'] = faults
+    prefix = f"/realms/{realm.name}"
+    oidc = f"{prefix}/protocol/openid-connect"
+
+    def issuer():
+        return f"{request.host_url.rstrip('/')}{prefix}"
+
+    def client_credentials():
+        if request.authorization and request.authorization.type == 'basic':
+            return request.authorization.username, request.authorization.password
+        return request.form.get('client_id'), request.form.get('client_secret')
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith(prefix) and faults.apply():
+            return oauth_error('temporarily_unavailable', 'Injected failure', 503)
+
+    @app.route('/health/ready')
+    def health_ready():
+        return jsonify({'status': 'UP', 'checks': []})
+
+    @app.route(f"{prefix}/.well-known/openid-configuration")
+    def discovery():
+        base = issuer()
+        return jsonify({
+            'issuer': base,
+            'authorization_endpoint': f"{base}/protocol/openid-connect/auth",
+            'token_endpoint': f"{base}/protocol/openid-connect/token",
+            'userinfo_endpoint': f"{base}/protocol/openid-connect/userinfo",
+            'jwks_uri': f"{base}/protocol/openid-connect/certs",
+            'grant_types_supported': ['authorization_code', 'password', 'refresh_token', 'client_credentials'],
+            'response_types_supported': ['code'],
+            'subject_types_supported': ['public'],
+            'id_token_signing_alg_values_supported': ['RS256'],
+            'token_endpoint_auth_methods_supported': ['client_secret_basic', 'client_secret_post'],
+            'scopes_supported': ['openid', 'email', 'profile'],
+        })
+
+    @app.route(f"{oidc}/certs")
+    def certs():
+        return jsonify(realm.jwks)
+
+    @app.route(f"{oidc}/auth", methods=['GET', 'POST'])
+    def authorize():
+        params = request.values
+        client = realm.clients.get(params.get('client_id'))
+        redirect_uri = params.get('redirect_uri')
+        if not client or not redirect_uri:
+            return oauth_error('invalid_request', 'Unknown client or missing redirect_uri')
+        if params.get('response_type') != 'code':
+            return oauth_error('unsupported_response_type', 'Only response_type=code is supported')
+
+        if request.method == 'GET':
+            keep = ('client_id', 'redirect_uri', 'response_type', 'scope', 'state', 'nonce')
+            hidden = "\n".join(
+                f'<input type="hidden" name="{key}" value="{html.escape(params[key])}">'
+                for key in keep if key in params
+            )
+            return LOGIN_FORM.format(realm=realm.name, hidden=hidden)
+
+        user = realm.check_password(params.get('username'), params.get('password'))
+        if not user:
+            return LOGIN_FORM.format(realm=realm.name, hidden='<p>Invalid username or password.</p>'), 401
+
+        code = realm.new_code(user['username'], client['clientId'], redirect_uri,
+                              params.get('scope', 'openid'), params.get('nonce'))
+        query = {'code': code, 'session_state': str(uuid.uuid4())}
+        if params.get('state'):
+            query['state'] = params['state']
+        separator = '&' if '?' in redirect_uri else '?'
+        return redirect(f"{redirect_uri}{separator}{urlencode(query)}")
+
+    @app.route(f"{oidc}/token", methods=['POST'])
+    def token():
+        client_id, client_secret = client_credentials()
+        client = realm.check_client(client_id, client_secret)
+        if not client:
+            return oauth_error('unauthorized_client', 'Invalid client or Invalid client credentials', 401)
+
+        grant_type = request.form.get('grant_type')
+        scope = request.form.get('scope') or 'openid email profile'
+
+        if grant_type == 'password':
+            if not client.get('directAccessGrantsEnabled', False):
+                return oauth_error('unauthorized_client', 'Client not allowed for direct access grants')
+            user = realm.check_password(request.form.get('username'), request.form.get('password'))
+            if not user:
+                return oauth_error('invalid_grant', 'Invalid user credentials', 401)
+            return jsonify(realm.issue_tokens(issuer(), client_id, realm.user_claims(user), scope))
+
+        if grant_type == 'authorization_code':
+            entry = realm.redeem_code(request.form.get('code', ''))
+            if not entry:
+                return oauth_error('invalid_grant', 'Code not valid')
+            username, code_client, redirect_uri, code_scope, nonce, _ = entry
+            if code_client != client_id or redirect_uri != request.form.get('redirect_uri'):
+                return oauth_error('invalid_grant', 'Incorrect redirect_uri or client')
+            user = realm.users.get(username)
+            return jsonify(realm.issue_tokens(issuer(), client_id, realm.user_claims(user), code_scope, nonce))
+
+        if grant_type == 'refresh_token':
+            claims = realm.verify(request.form.get('refresh_token', ''), issuer(), 'Refresh')
+            if not claims or claims.get('azp') != client_id:
+                return oauth_error('invalid_grant', 'Invalid refresh token')
+            username = next((name for name, user in realm.users.items()
+                             if realm.user_claims(user)['sub'] == claims['sub']), None)
+            subject = (realm.user_claims(realm.users[username]) if username
+                       else realm.service_account_claims(client_id))
+            return jsonify(realm.issue_tokens(issuer(), client_id, subject, claims.get('scope', scope),
+                                              session_state=claims.get('session_state')))
+
+        if grant_type == 'client_credentials':
+            if not client.get('serviceAccountsEnabled', False):
+                return oauth_error('unauthorized_client', 'Client not enabled to retrieve service account')
+            return jsonify(realm.issue_tokens(issuer(), client_id, realm.service_account_claims(client_id), scope))
+
+        return oauth_error('unsupported_grant_type', f"Unsupported grant_type: {grant_type}")
+
+    @app.route(f"{oidc}/userinfo", methods=['GET', 'POST'])
+    def userinfo():
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return oauth_error('invalid_request', 'Token not provided', 401)
+        claims = realm.verify(header[7:], issuer(), 'Bearer')
+        if not claims:
+            return oauth_error('invalid_token', 'Token verification failed', 401)
+
+        keep = ('sub', 'preferred_username', 'email', 'email_verified', 'given_name', 'family_name', 'name')
+        return jsonify({key: claims[key] for key in keep if key in claims})
+
+    return app
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Offline Keycloak/OIDC stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv('MOCK_KEYCLOAK_PORT', DEFAULT_PORT)))
+    parser.add_argument("--realm-file", default=REALM_FILE)
+    parser.add_argument("--latency-ms", type=float, default=float(os.getenv('MOCK_KEYCLOAK_LATENCY_MS', 0)),
+                        help="fixed delay added to every realm request")
+    parser.add_argument("--jitter-ms", type=float, default=float(os.getenv('MOCK_KEYCLOAK_JITTER_MS', 0)),
+                        help="extra uniformly distributed delay on top of --latency-ms")
+    parser.add_argument("--error-rate", type=float, default=float(os.getenv('MOCK_KEYCLOAK_ERROR_RATE', 0)),
+                        help="fraction of realm requests answered with 503")
+    parser.add_argument("--seed", type=int, help="seed for reproducible jitter and errors")
+    parser.add_argument("--token-lifespan", type=int, help="access token lifetime in seconds")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    app = create_app(args.realm_file, args.latency_ms, args.jitter_ms, args.error_rate, args.seed,
+                     args.token_lifespan)
+    realm = app.config['MOCK_REALM']
+    print("🧪 Starting offline Keycloak stand-in")
+    print(f"🏛️ Realm: {realm.name} ({len(realm.users)} users, {len(realm.clients)} clients)")
+    print(f"🔐 Issuer: http://{args.host}:{args.port}/realms/{realm.name}")
+    print(f"⏱️ Injected latency: {args.latency_ms:g}ms + up to {args.jitter_ms:g}ms, error rate {args.error_rate:g}")
+    app.run(host=args.host, port=args.port, threaded=True)
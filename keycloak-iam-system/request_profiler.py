@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Request Profiler for the Keycloak IAM System
+Samples the stacks of in-flight requests from a background thread and keeps
+the profiles of a random fraction of requests, plus every request slower
+than a threshold, in a ring buffer that can be exported as collapsed stacks
+"""
+
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_INTERVAL_MS = 5.0
+DEFAULT_CAPACITY = 50
+MAX_DEPTH = 128
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ActiveRequest:
+    """Stack samples for one request while it runs"""
+
+    def __init__(self, method, path, sampled):
+        self.method = method
+        self.path = path
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.stacks = Counter()
+        self.status = None
+
+
+class RequestProfiler:
+    """Opt-in stack sampler for Flask requests
+
+    Nothing is hooked in while both sample_rate and slow_ms are off. When
+    either is on, every request registers its thread and one sampler thread
+    walks the stacks of all registered threads every interval; the samples of
+    a request are only kept if it was picked by sample_rate or took at least
+    slow_ms, so slow requests are captured from their first sample.
+    Requests that end before the first sample are not stored.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_ms=0.0, interval_ms=DEFAULT_INTERVAL_MS,
+                 capacity=DEFAULT_CAPACITY, exclude=()):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000.0
+        self.exclude = tuple(exclude)
+        self.profiles = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Settings from PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_INTERVAL_MS and PROFILE_CAPACITY"""
+        return cls(sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+                   slow_ms=float(os.getenv('PROFILE_SLOW_MS', '0')),
+                   interval_ms=float(os.getenv('PROFILE_INTERVAL_MS', DEFAULT_INTERVAL_MS)),
+                   capacity=int(os.getenv('PROFILE_CAPACITY', DEFAULT_CAPACITY)), **kwargs)
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def configure(self, sample_rate=None, slow_ms=None, capacity=None):
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+        if slow_ms is not None:
+            if slow_ms < 0:
+                raise ValueError("slow_ms must not be negative")
+            self.slow_ms = slow_ms
+        if capacity is not None:
+            if capacity < 1:
+                raise ValueError("capacity must be at least 1")
+            with self._lock:
+                self.profiles = deque(self.profiles, maxlen=capacity)
+
+    def settings(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'interval_ms': self.interval * 1000.0,
+            'capacity': self.profiles.maxlen,
+            'stored': len(self.profiles),
+        }
+
+    def install(self, app):
+        """Hook the profiler into a Flask app's request lifecycle"""
+        from flask import request
+
+        @app.before_request
+        def begin_profile():
+            if self.enabled and not request.path.startswith(self.exclude):
+                self.begin(request.method, request.path)
+
+        @app.after_request
+        def record_status(response):
+            active = self._active.get(threading.get_ident())
+            if active is not None:
+                active.status = response.status_code
+            return response
+
+        @app.teardown_request
+        def end_profile(exc):
+            self.end()
+
+    def begin(self, method, path):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return
+        self._active[threading.get_ident()] = ActiveRequest(method, path, sampled)
+        if self._sampler is None:
+            with self._lock:
+                if self._sampler is None:
+                    self._sampler = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                    self._sampler.start()
+
+    def end(self):
+        active = self._active.pop(threading.get_ident(), None)
+        if active is None:
+            return None
+        duration_ms = (time.perf_counter() - active.start) * 1000.0
+        slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+        # A request shorter than the interval may end before it is sampled; nothing to keep then
+        if not (slow or active.sampled) or not active.stacks:
+            return None
+        profile = {
+            'id': next(self._ids),
+            'method': active.method,
+            'path': active.path,
+            'status': active.status,
+            'started_at': active.started_at,
+            'duration_ms': round(duration_ms, 3),
+            'reason': 'slow' if slow else 'sampled',
+            'samples': sum(active.stacks.values()),
+            'stacks': Counter(active.stacks),
+        }
+        with self._lock:
+            self.profiles.append(profile)
+        return profile
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, active in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                # Root first, as collapsed stacks are written
+                active.stacks[tuple(reversed(stack))] += 1
+
+    def summaries(self):
+        """Stored profiles without their stacks, newest first"""
+        with self._lock:
+            profiles = list(self.profiles)
+        return [{key: value for key, value in profile.items() if key != 'stacks'} for profile in reversed(profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for profile in self.profiles:
+                if profile['id'] == profile_id:
+                    return profile
+        return None
+
+    def stack_counts(self, profile):
+        """A profile's stacks as readable frame lists, most sampled first"""
+        return [{'stack': [frame_label(code) for code in stack], 'count': count}
+                for stack, count in profile['stacks'].most_common()]
+
+    def collapsed(self, profiles=None):
+        """Collapsed-stack text (one 'frame;frame;frame count' line per stack) for flamegraph.pl or speedscope"""
+        if profiles is None:
+            with self._lock:
+                profiles = list(self.profiles)
+        merged = Counter()
+        for profile in profiles:
+            merged.update(profile['stacks'])
+        lines = [';'.join(frame_label(code) for code in stack) + f" {count}" for stack, count in merged.items()]
+        return '\n'.join(sorted(lines)) + ('\n' if lines else '')
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Request Tracing for the Keycloak IAM System
+Per-request spans with W3C traceparent propagation, buffered in memory and
+exported in batches by a background thread to a JSON-lines file or an HTTP
+collector. Unsampled requests only pay for a context-variable lookup per span
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+
+BATCH_SIZE = 512
+FLUSH_INTERVAL = 1.0
+MAX_QUEUE = 10000
+EXPORT_TIMEOUT = 5
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+INVALID_TRACE_ID = '0' * 32
+INVALID_SPAN_ID = '0' * 16
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+def new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def parse_traceparent(value):
+    """Return (trace_id, parent_span_id, sampled) from a traceparent header, or None if it is invalid"""
+    match = TRACEPARENT.match((value or '').strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == INVALID_TRACE_ID or span_id == INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 0x01)
+
+
+class NoopSpan:
+    """Stands in for a span when the request is not sampled"""
+
+    sampled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def traceparent(self):
+        return None
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class RemoteParent(NoopSpan):
+    """An unsampled incoming trace: no spans are recorded, but its traceparent is passed on"""
+
+    def __init__(self, header):
+        self.header = header
+        self._token = None
+
+    def __enter__(self):
+        # Current for the request, so inject() finds the header; its children are all NOOP_SPAN
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+    def traceparent(self):
+        return self.header
+
+
+class Span:
+    """One timed operation; becomes the current span while its with-block runs"""
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes',
+                 'start_ns', 'end_ns', 'status', '_token')
+    sampled = True
+
+    def __init__(self, tracer, name, trace_id, parent_id=None, kind='internal', attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start_ns = None
+        self.end_ns = None
+        self.status = 'ok'
+        self._token = None
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.status = 'error'
+            self.attributes['error'] = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        self.tracer.exporter.export(self)
+        return False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self, service):
+        return {
+            'service': service,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6,
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class BatchSpanExporter:
+    """Queues finished spans and writes them in batches from a daemon thread
+
+    export() never blocks: once MAX_QUEUE spans are waiting, new ones are
+    dropped and counted, so a slow collector can't back up into requests.
+    """
+
+    def __init__(self, service, path=None, url=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_queue=MAX_QUEUE):
+        self.service = service
+        self.path = path
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        if self._writer is None:
+            self.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='span-exporter', daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+        return self
+
+    def close(self):
+        """Flush everything still queued and stop the writer"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(timeout=EXPORT_TIMEOUT * 2)
+
+    def _write_loop(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            spans = [span.to_dict(self.service) for span in batch if span is not None]
+            if spans:
+                try:
+                    self.write(spans)
+                    self.exported += len(spans)
+                except Exception as e:
+                    self.failed += len(spans)
+                    print(f"Span export failed: {e}")
+            if stop:
+                return
+
+    def write(self, spans):
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(''.join(json.dumps(span) + '\n' for span in spans))
+        if self.url:
+            body = json.dumps({'spans': spans}).encode()
+            request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'},
+                                             method='POST')
+            with urllib.request.urlopen(request, timeout=EXPORT_TIMEOUT):
+                pass
+
+
+class Tracer:
+    """Starts a trace per request and hands out child spans
+
+    Tracing is enabled when an exporter is configured. A request continues an
+    incoming traceparent and follows its sampled flag; without one it is
+    sampled with probability sample_rate.
+    """
+
+    def __init__(self, service, exporter=None, sample_rate=0.0):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_env(cls, service):
+        """Settings from TRACE_EXPORT_FILE, TRACE_EXPORT_URL, TRACE_SAMPLE_RATE and TRACE_BATCH_SIZE"""
+        path = os.getenv('TRACE_EXPORT_FILE')
+        url = os.getenv('TRACE_EXPORT_URL')
+        exporter = None
+        if path or url:
+            exporter = BatchSpanExporter(service, path=path, url=url,
+                                         batch_size=int(os.getenv('TRACE_BATCH_SIZE', BATCH_SIZE)))
+        return cls(service, exporter, sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0')))
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def span(self, name, kind='internal', **attributes):
+        """A child of the current span, or NOOP_SPAN when the request isn't sampled"""
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, kind, attributes)
+
+    def start_request(self, name, traceparent=None, **attributes):
+        """Root span for an incoming request; the caller enters and exits it"""
+        incoming = parse_traceparent(traceparent)
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = None, None
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled:
+            return RemoteParent(traceparent.strip()) if incoming is not None else NOOP_SPAN
+        return Span(self, name, trace_id or new_id(128), parent_id, 'server', attributes)
+
+    def inject(self, headers=None):
+        """Headers with the current traceparent added, for an outgoing request"""
+        headers = dict(headers or {})
+        current = _current.get()
+        if current is not None:
+            header = current.traceparent()
+            if header:
+                headers['traceparent'] = header
+        return headers
+
+    def install(self, app):
+        """Wrap every request of a Flask app in a server span"""
+        if not self.enabled:
+            return
+        from flask import g, request
+
+        @app.before_request
+        def start_trace():
+            span = self.start_request(f"{request.method} {request.path}", request.headers.get('traceparent'),
+                                      **{'http.method': request.method, 'http.target': request.path})
+            g.trace_span = span.__enter__()
+
+        @app.after_request
+        def record_status(response):
+            span = g.get('trace_span')
+            if span is not None:
+                span.set_attribute('http.status_code', response.status_code)
+                if request.url_rule is not None:
+                    span.set_attribute('http.route', request.url_rule.rule)
+            return response
+
+        @app.teardown_request
+        def end_trace(exc):
+            span = g.pop('trace_span', None)
+            if span is not None:
+                span.__exit__(type(exc) if exc else None, exc, None)
@@ -5,10 +5,18 @@ This script tests all API endpoints with and without valid tokens
 """
 
 import requests
+import argparse
 import json
 import sys
 import time
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from loadgen import LoadGenerator, EndpointStats, LOAD_ENDPOINTS, DEFAULT_LOAD_ENDPOINTS, summarize_stats
+from bench_results import (write_json, write_junit, load_json, compare_to_baseline,
+                           describe_regression, RESULTS_VERSION, DEFAULT_THRESHOLD)
 
 # Configuration
 FLASK_URL = "http://localhost:5000"
@@ -17,6 +25,10 @@ KEYCLOAK_CREDENTIALS = {
     "testuser": {"username": "testuser", "password": "testpassword"}
 }
 SIMPLE_JWT_CREDENTIALS = {"username": "admin", "password": "password"}
+MAX_WORKERS = 4
+READY_TIMEOUT = 30
+LOAD_DURATION = 10.0
+LOAD_CONCURRENCY = 8
 
 class Colors:
     GREEN = '\033[92m'
@@ -28,12 +40,55 @@ class Colors:
     END = '\033[0m'
     BOLD = '\033[1m'
 
+class TimedSession(requests.Session):
+    """requests.Session that reports the wall-clock time of every request"""
+    
+    def __init__(self, on_request):
+        super().__init__()
+        self.on_request = on_request
+        
+    def request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        status = 0
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self.on_request(method, url, status, time.perf_counter() - start)
+
 class APITester:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._lock = threading.Lock()
         self.keycloak_tokens = {}
         self.simple_jwt_token = None
         self.test_results = []
+        self.request_timings = []
+        self.started_at = None
+        self.elapsed = 0.0
+        self.load_generator = None
+        
+    @property
+    def session(self):
+        """Per-thread HTTP session so concurrent tests don't share a connection pool"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = TimedSession(self.record_request)
+            self._local.session = session
+        return session
+        
+    def record_request(self, method, url, status, duration):
+        """Record the timing of one HTTP request made by the current test"""
+        with self._lock:
+            self.request_timings.append({
+                "test": getattr(self._local, 'current_test', None),
+                "method": method.upper(),
+                "path": urlsplit(url).path,
+                "status": status,
+                "duration_ms": round(duration * 1000.0, 3)
+            })
         
     def log(self, message, color=Colors.END):
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -52,11 +107,33 @@ class APITester:
         self.log(f"ℹ️  {message}", Colors.BLUE)
         
     def record_test(self, test_name, passed, details=""):
-        self.test_results.append({
-            "test": test_name,
-            "passed": passed,
-            "details": details
-        })
+        test_start = getattr(self._local, 'test_start', None)
+        duration_ms = round((time.perf_counter() - test_start) * 1000.0, 3) if test_start else None
+        with self._lock:
+            self.test_results.append({
+                "test": test_name,
+                "passed": passed,
+                "details": details,
+                "duration_ms": duration_ms
+            })
+            
+    def wait_until_ready(self, timeout=READY_TIMEOUT):
+        """Poll the health endpoint until the app answers, backing off between attempts"""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            try:
+                response = self.session.get(f"{FLASK_URL}/health", timeout=5)
+                if response.status_code == 200:
+                    return True
+            except requests.exceptions.RequestException:
+                pass
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
         
     def test_public_api(self):
         """Test public API endpoint"""
@@ -272,35 +349,82 @@ class APITester:
             self.record_test("Health Check", False, str(e))
             return False
             
+    def build_test_graph(self):
+        """Declare every test with the names of the tests it depends on"""
+        return {
+            "Health Check": (self.test_health_endpoint, []),
+            "Public API": (self.test_public_api, []),
+            "Keycloak Admin Login": (lambda: self.get_keycloak_token("admin") is not None, []),
+            "Keycloak Test User Login": (lambda: self.get_keycloak_token("testuser") is not None, []),
+            "Simple JWT Login": (lambda: self.get_simple_jwt_token() is not None, []),
+            "Keycloak Protected API (Admin)": (lambda: self.test_keycloak_protected_api("admin"), ["Keycloak Admin Login"]),
+            "Keycloak Protected API (Test User)": (lambda: self.test_keycloak_protected_api("testuser"), ["Keycloak Test User Login"]),
+            "Simple JWT Protected API": (self.test_simple_jwt_protected_api, ["Simple JWT Login"]),
+            "Unauthorized Access Prevention": (self.test_unauthorized_access, []),
+            "Invalid Token Rejection": (self.test_invalid_token, [])
+        }
+        
+    def run_test_graph(self, tests):
+        """Run tests on a thread pool as soon as their dependencies have finished"""
+        for test_name, (_, deps) in tests.items():
+            unknown = [dep for dep in deps if dep not in tests]
+            if unknown:
+                raise ValueError(f"Test '{test_name}' depends on unknown tests: {', '.join(unknown)}")
+        
+        pending = dict(tests)
+        outcomes = {}
+        running = {}
+        
+        def run_one(test_name, test_func):
+            self._local.current_test = test_name
+            self._local.test_start = time.perf_counter()
+            try:
+                return bool(test_func())
+            except Exception as e:
+                self.log_error(f"Test '{test_name}' crashed: {e}")
+                return False
+            finally:
+                self._local.current_test = None
+                self._local.test_start = None
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for test_name, (test_func, deps) in list(pending.items()):
+                    if not all(dep in outcomes for dep in deps):
+                        continue
+                    del pending[test_name]
+                    failed = [dep for dep in deps if not outcomes[dep]]
+                    if failed:
+                        self.log_warning(f"Skipping '{test_name}': {', '.join(failed)} failed")
+                        self.record_test(test_name, False, f"Skipped - {', '.join(failed)} failed")
+                        outcomes[test_name] = False
+                    else:
+                        running[pool.submit(run_one, test_name, test_func)] = test_name
+                
+                if not running:
+                    if pending:
+                        raise ValueError(f"Dependency cycle between tests: {', '.join(pending)}")
+                    continue
+                
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    outcomes[running.pop(future)] = future.result()
+        
+        return outcomes
+        
     def run_all_tests(self):
         """Run all API tests"""
         self.log(f"{Colors.BOLD}{Colors.CYAN}🧪 Starting Comprehensive API Testing{Colors.END}")
         self.log(f"{Colors.BOLD}Target: {FLASK_URL}{Colors.END}")
         print("=" * 60)
         
-        # Test sequence
-        tests = [
-            ("Health Check", self.test_health_endpoint),
-            ("Public API", self.test_public_api),
-            ("Keycloak Admin Login", lambda: self.get_keycloak_token("admin") is not None),
-            ("Keycloak Test User Login", lambda: self.get_keycloak_token("testuser") is not None),
-            ("Simple JWT Login", lambda: self.get_simple_jwt_token() is not None),
-            ("Keycloak Protected API (Admin)", lambda: self.test_keycloak_protected_api("admin")),
-            ("Keycloak Protected API (Test User)", lambda: self.test_keycloak_protected_api("testuser")),
-            ("Simple JWT Protected API", self.test_simple_jwt_protected_api),
-            ("Unauthorized Access Prevention", self.test_unauthorized_access),
-            ("Invalid Token Rejection", self.test_invalid_token)
-        ]
-        
-        for test_name, test_func in tests:
-            print()
-            try:
-                test_func()
-            except Exception as e:
-                self.log_error(f"Test '{test_name}' crashed: {e}")
-            time.sleep(0.5)  # Brief pause between tests
+        self.started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        self.run_test_graph(self.build_test_graph())
+        self.elapsed = time.perf_counter() - start
+        self.log_info(f"Test graph finished in {self.elapsed:.2f}s with {self.max_workers} workers")
             
-        self.print_test_summary()
+        return self.print_test_summary()
         
     def print_test_summary(self):
         """Print comprehensive test summary"""
@@ -325,7 +449,8 @@ class APITester:
             status = "✅ PASS" if result['passed'] else "❌ FAIL"
             color = Colors.GREEN if result['passed'] else Colors.RED
             details = f" - {result['details']}" if result['details'] else ""
-            print(f"{color}{status}{Colors.END} {result['test']}{details}")
+            timing = f" ({result['duration_ms']:.0f} ms)" if result['duration_ms'] is not None else ""
+            print(f"{color}{status}{Colors.END} {result['test']}{details}{timing}")
         
         print()
         
@@ -354,8 +479,181 @@ class APITester:
         
         print()
 
+    def run_load_test(self, endpoints, rate=None, concurrency=LOAD_CONCURRENCY, duration=LOAD_DURATION):
+        """Drive the given endpoints under load and print per-endpoint latency percentiles"""
+        mode = f"open loop at {rate:g} req/s" if rate else f"closed loop with {concurrency} clients"
+        self.log(f"{Colors.BOLD}{Colors.CYAN}📈 Starting Load Test ({mode}, {duration:g}s){Colors.END}")
+        self.log(f"{Colors.BOLD}Target: {FLASK_URL} - {', '.join(endpoints)}{Colors.END}")
+        print("=" * 60)
+        
+        keycloak_token = self.get_keycloak_token("admin") if "protected" in endpoints else None
+        simple_token = self.get_simple_jwt_token() if "protected-simple" in endpoints else None
+        if "protected" in endpoints and not keycloak_token:
+            self.log_warning("No Keycloak token - /api/protected requests will fail with 401")
+        if "protected-simple" in endpoints and not simple_token:
+            self.log_warning("No simple JWT token - /api/protected-simple requests will fail with 401")
+        
+        generator = LoadGenerator(
+            FLASK_URL,
+            endpoints,
+            concurrency=concurrency,
+            rate=rate,
+            duration=duration,
+            keycloak_token=keycloak_token,
+            simple_token=simple_token,
+            credentials=KEYCLOAK_CREDENTIALS["admin"],
+            record_samples=True
+        )
+        self.load_generator = generator
+        self.started_at = datetime.now(timezone.utc)
+        generator.run()
+        self.elapsed = generator.elapsed
+        results = generator.summary()
+        self.print_load_summary(results, generator)
+        
+        errors = sum(result['errors'] for result in results.values())
+        return 0 if errors == 0 else 1
+        
+    def print_load_summary(self, results, generator):
+        """Print throughput, error rate and latency percentiles per endpoint"""
+        print()
+        print("=" * 60)
+        self.log(f"{Colors.BOLD}{Colors.CYAN}📊 Load Test Summary ({generator.elapsed:.1f}s){Colors.END}")
+        print("=" * 60)
+        
+        header = f"{'endpoint':<18}{'reqs':>8}{'rps':>9}{'err%':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'p99.9':>9}{'max':>9}"
+        print(header)
+        print("-" * len(header))
+        for name, result in results.items():
+            pcts = result['percentiles_ms']
+            color = Colors.GREEN if result['errors'] == 0 else Colors.RED
+            print(f"{color}{name:<18}{result['requests']:>8}{result['throughput_rps']:>9.1f}"
+                  f"{result['error_rate'] * 100:>6.1f}%{pcts['p50']:>9.2f}{pcts['p90']:>9.2f}"
+                  f"{pcts['p99']:>9.2f}{pcts['p99.9']:>9.2f}{result['max_ms']:>9.2f}{Colors.END}")
+        print("Latencies in ms" + (" measured from the scheduled send time" if generator.rate else ""))
+        
+        if generator.rate and generator.backlog_max > generator.concurrency:
+            self.log_warning(f"Request backlog peaked at {generator.backlog_max} - "
+                             f"target rate exceeds what {generator.concurrency} clients can sustain")
+        print()
+
+    def build_results(self):
+        """Collect the last functional or load run into a results document"""
+        results = {
+            "version": RESULTS_VERSION,
+            "target": FLASK_URL,
+            "started_at": (self.started_at or datetime.now(timezone.utc)).isoformat(),
+            "duration_s": round(self.elapsed, 3),
+        }
+        generator = self.load_generator
+        if generator:
+            results["mode"] = "load"
+            results["config"] = {
+                "endpoints": generator.endpoints,
+                "rate": generator.rate,
+                "concurrency": generator.concurrency,
+                "duration": generator.duration
+            }
+            results["endpoints"] = generator.summary()
+            results["sample_fields"] = ["endpoint", "offset_ms", "latency_ms", "status"]
+            results["samples"] = generator.samples
+        else:
+            timings = [timing for timing in self.request_timings if timing['test']]
+            stats = {}
+            for timing in timings:
+                name = f"{timing['method']} {timing['path']}"
+                if name not in stats:
+                    stats[name] = EndpointStats(name)
+                stats[name].record(timing['duration_ms'] * 1000.0, timing['status'])
+            results["mode"] = "functional"
+            results["config"] = {"max_workers": self.max_workers}
+            results["tests"] = self.test_results
+            results["endpoints"] = summarize_stats(stats, self.elapsed)
+            results["requests"] = timings
+        return results
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Keycloak IAM System API tester")
+    parser.add_argument("--load", action="store_true",
+                        help="run a load test instead of the functional tests")
+    parser.add_argument("--endpoints", default=",".join(DEFAULT_LOAD_ENDPOINTS),
+                        help=f"comma-separated endpoints to load ({', '.join(LOAD_ENDPOINTS)})")
+    parser.add_argument("--rate", type=float,
+                        help="target request rate in req/s (open loop); omit for closed loop")
+    parser.add_argument("--concurrency", type=int, default=LOAD_CONCURRENCY,
+                        help="number of client threads")
+    parser.add_argument("--duration", type=float, default=LOAD_DURATION,
+                        help="load test duration in seconds")
+    parser.add_argument("--results-json", metavar="PATH",
+                        help="write per-request timings and summaries as JSON")
+    parser.add_argument("--junit-xml", metavar="PATH",
+                        help="write results as JUnit XML")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare against a stored results file and fail on regressions")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store this run as the --baseline file instead of comparing")
+    parser.add_argument("--latency-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative p95 latency increase (default: %(default)s)")
+    parser.add_argument("--throughput-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative throughput drop for load runs (default: %(default)s)")
+    args = parser.parse_args(argv)
+    
+    args.endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in args.endpoints if name not in LOAD_ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline requires --baseline")
+    return args
+
+def report_results(tester, args):
+    """Write result files and apply the baseline gate; returns an exit code"""
+    if not (args.results_json or args.junit_xml or args.baseline):
+        return 0
+    
+    results = tester.build_results()
+    regressions = []
+    
+    if args.baseline and args.save_baseline:
+        write_json(results, args.baseline)
+        tester.log_success(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        try:
+            baseline = load_json(args.baseline)
+            regressions = compare_to_baseline(results, baseline,
+                                              latency_threshold=args.latency_threshold,
+                                              throughput_threshold=args.throughput_threshold)
+        except (OSError, ValueError) as e:
+            tester.log_error(f"Cannot compare against baseline {args.baseline}: {e}")
+            return 1
+        
+        if regressions:
+            tester.log_error(f"Performance regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"{Colors.RED}   {describe_regression(regression)}{Colors.END}")
+        else:
+            tester.log_success(f"No regressions against {args.baseline} "
+                               f"(p95 +{args.latency_threshold:.0%}, throughput -{args.throughput_threshold:.0%})")
+    
+    results["regressions"] = regressions
+    if args.results_json:
+        write_json(results, args.results_json)
+        tester.log_info(f"Results written to {args.results_json}")
+    if args.junit_xml:
+        write_junit(results, args.junit_xml, regressions)
+        tester.log_info(f"JUnit XML written to {args.junit_xml}")
+    
+    return 1 if regressions else 0
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     print(f"{Colors.BOLD}{Colors.MAGENTA}")
     print("╔══════════════════════════════════════════════════════════╗")
     print("║           Keycloak IAM System API Tester                ║")
@@ -365,21 +663,22 @@ def main():
     print("╚══════════════════════════════════════════════════════════╝")
     print(f"{Colors.END}")
     
-    # Check if Flask app is accessible
-    try:
-        response = requests.get(f"{FLASK_URL}/health", timeout=5)
-        if response.status_code != 200:
-            print(f"{Colors.RED}❌ Flask app is not accessible at {FLASK_URL}{Colors.END}")
-            print(f"{Colors.YELLOW}   Make sure the services are running: docker-compose up -d{Colors.END}")
-            sys.exit(1)
-    except requests.exceptions.RequestException:
+    tester = APITester()
+    
+    # Wait for the Flask app to become accessible
+    if not tester.wait_until_ready():
         print(f"{Colors.RED}❌ Cannot connect to Flask app at {FLASK_URL}{Colors.END}")
         print(f"{Colors.YELLOW}   Make sure the services are running: docker-compose up -d{Colors.END}")
         sys.exit(1)
     
     # Run tests
-    tester = APITester()
-    exit_code = tester.run_all_tests()
+    if args.load:
+        exit_code = tester.run_load_test(args.endpoints, rate=args.rate,
+                                         concurrency=args.concurrency, duration=args.duration)
+    else:
+        exit_code = tester.run_all_tests()
+    
+    exit_code = report_results(tester, args) or exit_code
     
     print()
     print(f"{Colors.BOLD}🔗 Useful URLs:{Colors.END}")
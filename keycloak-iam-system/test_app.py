@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Tests for app.py helpers that don't need Keycloak running
+"""
+
+import json
+
+import pytest
+
+from app import JSONTemplate, app, warmup
+
+
+@pytest.mark.parametrize('static, fields', [
+    ({'status': 'ok'}, {'timestamp': 1}),
+    ({'status': 'ok'}, {}),
+    ({}, {'timestamp': 1}),
+    ({}, {}),
+])
+def test_json_template_renders_valid_json(static, fields):
+    assert json.loads(JSONTemplate(**static).render(**fields)) == {**static, **fields}
+
+
+def test_health_while_starting_reports_prewarm_steps(monkeypatch):
+    monkeypatch.setattr(warmup, 'steps', {'imports': {'ok': True, 'ms': 1.0, 'attempts': 1}})
+    monkeypatch.setattr(warmup.ready, 'is_set', lambda: False)
+    response = app.test_client().get('/health')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'starting', 'prewarm': warmup.steps}
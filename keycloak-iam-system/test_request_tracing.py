@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for Request Tracing
+Checks that the traceparent of a request is passed on by inject(),
+whether or not the request is sampled
+"""
+
+from flask import Flask, jsonify
+
+from request_tracing import BatchSpanExporter, Tracer
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class ListExporter(BatchSpanExporter):
+    """Keeps finished spans in a list instead of exporting them"""
+
+    def __init__(self):
+        super().__init__('test')
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def make_app(sample_rate):
+    tracer = Tracer('test', ListExporter(), sample_rate=sample_rate)
+    app = Flask(__name__)
+    tracer.install(app)
+
+    @app.route('/upstream')
+    def upstream():
+        with tracer.span('call upstream'):
+            return jsonify(tracer.inject())
+
+    return app, tracer
+
+
+def test_unsampled_traceparent_is_forwarded():
+    app, tracer = make_app(sample_rate=1.0)
+    header = f"00-{TRACE_ID}-{PARENT_ID}-00"
+    response = app.test_client().get('/upstream', headers={'traceparent': header})
+    assert response.get_json() == {'traceparent': header}
+    assert tracer.exporter.spans == []
+    assert tracer.inject() == {}
+
+
+def test_sampled_traceparent_continues_the_trace():
+    app, tracer = make_app(sample_rate=0.0)
+    response = app.test_client().get('/upstream', headers={'traceparent': f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    _, trace_id, span_id, flags = response.get_json()['traceparent'].split('-')
+    assert (trace_id, flags) == (TRACE_ID, '01')
+    child, root = tracer.exporter.spans
+    assert span_id == child.span_id
+    assert (root.trace_id, root.parent_id, child.parent_id) == (TRACE_ID, PARENT_ID, root.span_id)
+
+
+def test_no_traceparent_without_incoming_trace():
+    app, _ = make_app(sample_rate=0.0)
+    assert app.test_client().get('/upstream').get_json() == {}